@@ -0,0 +1,144 @@
+"""Offline batch triage of archived symptom sets.
+
+Input is JSON Lines, one intake per line, either a bare list of symptoms or
+an object such as::
+
+    {"id": "A-1041", "symptoms": ["fever", "cough"], "duration": "3 days",
+     "severity": "moderate", "label": "flu"}
+
+Run it with::
+
+    python -m actions.batch intake.jsonl -o results.jsonl
+
+Results are streamed back chunk by chunk as worker processes finish them,
+and a summary scored against the optional ``label`` field is printed at
+the end.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Set, Text
+
+from .actions import StudentHealthDatabase
+
+
+def read_symptom_sets(stream: IO[Text]) -> Iterator[Dict[Text, Any]]:
+    """Parse intake records lazily from a JSON Lines stream"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if isinstance(record, list):
+            record = {"symptoms": record}
+        record.setdefault("id", line_number)
+        yield record
+
+
+def diagnose(records: List[Dict[Text, Any]], k: int = 3) -> List[Dict[Text, Any]]:
+    """Triage one chunk of intake records in the current process"""
+    kb = StudentHealthDatabase.SNAPSHOT
+    results = []
+    for record in records:
+        symptoms = record.get("symptoms") or []
+        candidates = StudentHealthDatabase.rank_ailments(
+            symptoms, record.get("duration"), record.get("severity"), k, kb
+        )
+        result = {
+            "id": record["id"],
+            "emergency": StudentHealthDatabase.check_emergency(symptoms, kb),
+            "ailment": candidates[0][0] if candidates else None,
+            "candidates": [{"ailment": a, "score": s, "match_percentage": p} for a, s, p in candidates],
+            "kb_version": kb.version,
+        }
+        if "label" in record:
+            result["label"] = record["label"]
+        results.append(result)
+    return results
+
+
+def diagnose_batch(records: Iterable[Dict[Text, Any]], chunk_size: int = 500,
+                   workers: Optional[int] = None, k: int = 3) -> Iterator[Dict[Text, Any]]:
+    """Fan records out over a process pool and yield results as chunks complete
+
+    At most two chunks per worker are in flight, so memory stays bounded no
+    matter how long the input is. Results arrive in completion order; use
+    the ``id`` field to join them back to the input.
+    """
+    records = iter(records)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        max_pending = 2 * workers
+        pending: Set[Future] = set()
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(itertools.islice(records, chunk_size))
+                if not chunk:
+                    break
+                pending.add(pool.submit(diagnose, chunk, k))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+class BatchReport:
+    """Running totals for a batch, scored against clinician labels"""
+
+    def __init__(self):
+        self.cases = 0
+        self.emergencies = 0
+        self.unidentified = 0
+        self.labelled = 0
+        self.top1 = 0
+        self.topk = 0
+
+    def add(self, result: Dict[Text, Any]) -> None:
+        self.cases += 1
+        self.emergencies += result["emergency"]
+        self.unidentified += result["ailment"] is None
+        if "label" in result:
+            self.labelled += 1
+            self.top1 += result["ailment"] == result["label"]
+            self.topk += any(c["ailment"] == result["label"] for c in result["candidates"])
+
+    def as_dict(self) -> Dict[Text, Any]:
+        summary = {
+            "cases": self.cases,
+            "emergencies": self.emergencies,
+            "unidentified": self.unidentified,
+            "labelled": self.labelled,
+        }
+        if self.labelled:
+            summary["top1_accuracy"] = self.top1 / self.labelled
+            summary["topk_accuracy"] = self.topk / self.labelled
+        return summary
+
+
+def main(argv: Optional[List[Text]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Triage a JSON Lines file of symptom sets.")
+    parser.add_argument("input", help="JSON Lines intake file, or - for stdin.")
+    parser.add_argument("-o", "--output", default="-", help="Where to write result lines.")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("-k", type=int, default=3, help="Candidates to keep per case.")
+    args = parser.parse_args(argv)
+
+    report = BatchReport()
+    with ExitStack() as stack:
+        source = sys.stdin if args.input == "-" else stack.enter_context(open(args.input, encoding="utf-8"))
+        sink = sys.stdout if args.output == "-" else stack.enter_context(open(args.output, "w", encoding="utf-8"))
+        for result in diagnose_batch(read_symptom_sets(source), args.chunk_size, args.workers, args.k):
+            report.add(result)
+            sink.write(json.dumps(result) + "\n")
+    print(json.dumps(report.as_dict(), indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
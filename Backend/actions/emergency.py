@@ -0,0 +1,122 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Text, Tuple
+
+from .fuzzy import FuzzyVocabulary
+
+
+class AhoCorasick:
+    """Multi-pattern automaton that finds every pattern in one pass over a text"""
+
+    def __init__(self, patterns: Iterable[Text]):
+        self.patterns: List[Text] = []
+        self._goto: List[Dict[Text, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for pattern in dict.fromkeys(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = next_state
+            self._out[state] += (len(self.patterns),)
+            self.patterns.append(pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def finditer(self, text: Text) -> Iterator[Tuple[int, int]]:
+        """Yield (start offset, pattern id) for every occurrence in the text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in out[state]:
+                yield end - len(self.patterns[pattern_id]), pattern_id
+
+
+class EmergencyDetector:
+    """Shared emergency screening over clinical symptoms and free-text keywords
+
+    The phrase lists, including the high-precision ``alert_phrases`` that
+    may trigger an alert before NLU, are compiled into a single automaton,
+    so the cost of a scan depends on the length of the text and not on how
+    many phrases the lists hold.
+    """
+
+    SYMPTOM = "symptom"
+    KEYWORD = "keyword"
+    ALERT = "alert"
+
+    def __init__(self, symptoms: Iterable[Text], keywords: Iterable[Text],
+                 vocabulary: Optional[FuzzyVocabulary] = None,
+                 alert_phrases: Iterable[Text] = ()):
+        symptoms = [s.lower() for s in symptoms]
+        keywords = [k.lower() for k in keywords]
+        alert_phrases = [p.lower() for p in alert_phrases]
+        kinds = ((self.SYMPTOM, symptoms), (self.KEYWORD, keywords), (self.ALERT, alert_phrases))
+        self._automaton = AhoCorasick(symptoms + keywords + alert_phrases)
+        self._kinds: List[frozenset] = [
+            frozenset(kind for kind, phrases in kinds if pattern in phrases)
+            for pattern in self._automaton.patterns
+        ]
+        self.vocabulary = vocabulary or FuzzyVocabulary(symptoms)
+        # Symptom text that is itself part of an emergency phrase also counts.
+        self._symptom_fragments = frozenset(
+            symptom[i:j]
+            for symptom in symptoms
+            for i in range(len(symptom) + 1)
+            for j in range(i, len(symptom) + 1)
+        )
+
+    def scan(self, text: Text, kind: Optional[Text] = None) -> List[Tuple[int, Text]]:
+        """Return (offset, phrase) for each emergency phrase found in the text"""
+        return [
+            (start, self._automaton.patterns[pattern_id])
+            for start, pattern_id in self._automaton.finditer(text.lower())
+            if kind is None or kind in self._kinds[pattern_id]
+        ]
+
+    def _contains(self, text: Text, kind: Text) -> bool:
+        for _, pattern_id in self._automaton.finditer(text):
+            if kind in self._kinds[pattern_id]:
+                return True
+        return False
+
+    def has_keyword(self, text: Text) -> bool:
+        """Check free text for any emergency keyword"""
+        return self._contains(text.lower(), self.KEYWORD)
+
+    def has_alert_phrase(self, text: Text) -> bool:
+        """Check free text for a phrase that warrants an alert before NLU"""
+        return self._contains(text.lower(), self.ALERT)
+
+    def is_emergency_symptom(self, symptom: Text) -> bool:
+        """Check whether a symptom and an emergency symptom contain one another
+
+        A misspelled emergency symptom ("chest pian") is spell-corrected
+        against the vocabulary and checked again.
+        """
+        symptom = symptom.lower()
+        if symptom in self._symptom_fragments or self._contains(symptom, self.SYMPTOM):
+            return True
+        corrected = self.vocabulary.correct_text(symptom)
+        return corrected != symptom and (
+            corrected in self._symptom_fragments or self._contains(corrected, self.SYMPTOM)
+        )
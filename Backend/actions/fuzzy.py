@@ -0,0 +1,100 @@
+from typing import Dict, FrozenSet, Iterable, List, Optional, Text
+
+
+def char_wb_grams(word: Text, n: int = 2) -> FrozenSet[Text]:
+    """Character n-grams of a word padded with spaces, like ``char_wb``"""
+    padded = f" {word} "
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def edit_distance(a: Text, b: Text, limit: int) -> int:
+    """Optimal string alignment distance, giving up once it exceeds ``limit``"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit and min(previous) >= limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyVocabulary:
+    """Typo correction against the words used in the knowledge base
+
+    Words are indexed by character bigrams (the ``char_wb`` features of the
+    NLU pipeline), so a lookup only visits vocabulary words that share
+    enough n-grams with the query to pass the Dice similarity ``threshold``.
+    Those candidates are confirmed with a bounded edit distance: one edit
+    for words of up to five letters, two for longer ones, and none for
+    words shorter than ``min_length``.
+
+    Corrections are memoized per vocabulary, which lives as long as one
+    knowledge base snapshot, in a dict of at most ``maxsize`` words that is
+    emptied when it fills up.
+    """
+
+    def __init__(self, phrases: Iterable[Text], threshold: float = 0.3, min_length: int = 4,
+                 maxsize: int = 4096):
+        self.threshold = threshold
+        self.min_length = min_length
+        self.maxsize = maxsize
+        self._corrections: Dict[Text, Optional[Text]] = {}
+        self.words: List[Text] = list(dict.fromkeys(
+            word for phrase in phrases for word in phrase.lower().split()
+        ))
+        self._known = frozenset(self.words)
+        self._sizes: List[int] = []
+        self._postings: Dict[Text, List[int]] = {}
+        for word_id, word in enumerate(self.words):
+            grams = char_wb_grams(word)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(word_id)
+
+    def correct(self, word: Text) -> Optional[Text]:
+        """Return the closest vocabulary word, or None if nothing is close enough"""
+        if word in self._known:
+            return word
+        if len(word) < self.min_length:
+            return None
+        try:
+            return self._corrections[word]
+        except KeyError:
+            pass
+        if len(self._corrections) >= self.maxsize:
+            self._corrections = {}
+        best = self._corrections[word] = self._closest(word)
+        return best
+
+    def _closest(self, word: Text) -> Optional[Text]:
+        grams = char_wb_grams(word)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for word_id in self._postings.get(gram, ()):
+                shared[word_id] = shared.get(word_id, 0) + 1
+
+        limit = 1 if len(word) <= 5 else 2
+        best, best_key = None, None
+        for word_id, count in shared.items():
+            similarity = 2 * count / (len(grams) + self._sizes[word_id])
+            if similarity < self.threshold:
+                continue
+            distance = edit_distance(word, self.words[word_id], limit)
+            if distance > limit:
+                continue
+            key = (distance, -similarity, word_id)
+            if best_key is None or key < best_key:
+                best, best_key = self.words[word_id], key
+        return best
+
+    def correct_text(self, text: Text) -> Text:
+        """Correct each word of the text independently, keeping unknown words"""
+        return " ".join(self.correct(word) or word for word in text.lower().split())
@@ -0,0 +1,363 @@
+"""Compiled, memory-mapped storage for the student health knowledge base.
+
+The knowledge base is edited as YAML in ``knowledge_base/student_health.yml``
+and compiled into a flat binary artifact next to it. The artifact holds one
+table of interned UTF-8 strings, every record as integer string ids and the
+symptom postings used by :class:`SymptomIndex`. Workers map the file
+read-only, so processes on one host share its pages instead of each building
+their own copy of the dictionaries. What is derived from it at load time
+(see :class:`actions.knowledge.KnowledgeSnapshot`) is not in the file.
+
+Ailments are exposed as immutable :class:`Ailment` records with integer
+ids, tuple fields and interned strings, so a symptom or treatment shared by
+many ailments is held once. Records are decoded from the mapped tables each
+time they are read, not all at load time. ``KnowledgeBase.ailments`` keeps
+the old ``AILMENTS_DB`` mapping of plain dicts for existing callers.
+
+Rebuild the artifact, and the NLU data generated from the knowledge base
+(see :mod:`actions.nlu_data`), with::
+
+    python -m actions.kb
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence as SequenceABC
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Text, Tuple, Union
+
+from .fuzzy import FuzzyVocabulary
+from .symptom_index import SymptomIndex
+
+
+KB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge_base")
+KB_SOURCE = os.environ.get("HEALTH_KB_SOURCE", os.path.join(KB_DIR, "student_health.yml"))
+KB_ARTIFACT = os.environ.get("HEALTH_KB_ARTIFACT", os.path.join(KB_DIR, "student_health.kb"))
+
+MAGIC = b"SHKB"
+FORMAT_VERSION = 5
+LIST_FIELDS = ("symptoms", "treatments", "medications", "prevention")
+
+# magic, format version, sha256 of the YAML source, number of sections
+_HEADER = struct.Struct("<4sI32sI")
+# section name, byte offset, byte length
+_SECTION = struct.Struct("<16sII")
+
+
+def read_source(path: Text = KB_SOURCE) -> Dict[Text, Any]:
+    from ruamel.yaml import YAML
+
+    with open(path, encoding="utf-8") as f:
+        return YAML(typ="safe").load(f)
+
+
+def compile_kb(data: Dict[Text, Any], digest: bytes = b"") -> bytes:
+    """Serialize a parsed knowledge base into the binary artifact format"""
+    strings: Dict[Text, int] = {}
+
+    def intern(text: Text) -> int:
+        return strings.setdefault(text, len(strings))
+
+    ailments = data["ailments"]
+    sections: Dict[Text, Union[array, bytes]] = {}
+
+    records = array("I")
+    for name, record in ailments.items():
+        records.extend((intern(name), intern(record["duration"]), intern(record.get("severity", ""))))
+    sections["ailments"] = records
+
+    for field in LIST_FIELDS:
+        pointers, ids = array("I", [0]), array("I")
+        for record in ailments.values():
+            ids.extend(intern(value) for value in record[field])
+            pointers.append(len(ids))
+        sections[f"{field}.ptr"] = pointers
+        sections[f"{field}.ids"] = ids
+
+    sections["emergency.sym"] = array("I", (intern(s) for s in data["emergency_symptoms"]))
+    sections["emergency.kw"] = array("I", (intern(k) for k in data["emergency_keywords"]))
+    sections["emergency.alert"] = array("I", (intern(p) for p in data.get("emergency_alert_phrases") or ()))
+
+    medications, pointers, ids = array("I"), array("I", [0]), array("I")
+    for key, info in data["medication_info"].items():
+        medications.extend((intern(key), intern(info["dosage"]), intern(info["notes"])))
+        ids.extend(intern(alias) for alias in info.get("aliases", ()))
+        pointers.append(len(ids))
+    sections["medications"] = medications
+    sections["med.alias.ptr"] = pointers
+    sections["med.alias.ids"] = ids
+
+    symptom_counts, symptoms, owners = SymptomIndex.postings(ailments, data.get("symptom_synonyms"))
+    sections["index.count"] = array("I", symptom_counts)
+    sections["index.sym"] = array("I", (intern(s) for s in symptoms))
+    pointers, ids = array("I", [0]), array("I")
+    for ailment_ids in owners:
+        ids.extend(ailment_ids)
+        pointers.append(len(ids))
+    sections["index.ptr"] = pointers
+    sections["index.ail"] = ids
+
+    offsets, blob = array("I", [0]), bytearray()
+    for text in strings:
+        blob += text.encode("utf-8")
+        offsets.append(len(blob))
+    sections["strings.off"] = offsets
+    sections["strings.blob"] = bytes(blob)
+
+    payloads = []
+    for section in sections.values():
+        if isinstance(section, array):
+            if sys.byteorder != "little":
+                section = array("I", section)
+                section.byteswap()
+            section = section.tobytes()
+        payloads.append(section + b"\0" * (-len(section) % 4))
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    out = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, digest.ljust(32, b"\0"), len(sections)))
+    for name, section, payload in zip(sections, sections.values(), payloads):
+        out += _SECTION.pack(name.encode("ascii"), offset, len(section) * (4 if isinstance(section, array) else 1))
+        offset += len(payload)
+    for payload in payloads:
+        out += payload
+    return bytes(out)
+
+
+def build_artifact(source: Text = KB_SOURCE, artifact: Text = KB_ARTIFACT) -> Text:
+    """Compile the YAML source and atomically replace the artifact"""
+    with open(source, "rb") as f:
+        digest = hashlib.sha256(f.read()).digest()
+    compiled = compile_kb(read_source(source), digest)
+    tmp_path = f"{artifact}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compiled)
+    os.replace(tmp_path, artifact)
+    return artifact
+
+
+class Ailment(NamedTuple):
+    """One ailment; ``id`` is its position in ``KnowledgeBase.records``"""
+
+    id: int
+    name: Text
+    symptoms: Tuple[Text, ...]
+    treatments: Tuple[Text, ...]
+    medications: Tuple[Text, ...]
+    duration: Text
+    severity: Text
+    prevention: Tuple[Text, ...]
+
+    def as_dict(self) -> Dict[Text, Any]:
+        return {
+            "symptoms": list(self.symptoms),
+            "treatments": list(self.treatments),
+            "medications": list(self.medications),
+            "duration": self.duration,
+            "severity": self.severity,
+            "prevention": list(self.prevention),
+        }
+
+
+class AilmentsView(Mapping):
+    """Read-only ``AILMENTS_DB``-shaped mapping of plain dicts, for compatibility
+
+    Each access builds a fresh dict of lists from the record; new code
+    should use ``KnowledgeBase.records`` and ``ailment_ids`` instead.
+    """
+
+    def __init__(self, kb: "KnowledgeBase"):
+        self._kb = kb
+
+    def __getitem__(self, name: Text) -> Dict[Text, Any]:
+        return self._kb.ailment(name).as_dict()
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._kb.ailment_ids
+
+    def __iter__(self) -> Iterator[Text]:
+        return iter(self._kb.ailment_ids)
+
+    def __len__(self) -> int:
+        return len(self._kb.records)
+
+
+class AilmentRecords(SequenceABC):
+    """The ailments of a compiled knowledge base, decoded from its buffer on access
+
+    No record is kept: every lookup builds the :class:`Ailment` from the
+    mapped tables, so the records stay in the shared pages of the artifact
+    instead of being copied into each process. Hold on to a record only as
+    long as it is needed.
+    """
+
+    def __init__(self, kb: "KnowledgeBase"):
+        self._kb = kb
+        self._table = kb._u32("ailments")
+        self._fields = {field: (kb._u32(f"{field}.ptr"), kb._u32(f"{field}.ids")) for field in LIST_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self._table) // 3
+
+    def name(self, i: int) -> Text:
+        return self._kb.string(self._table[3 * i])
+
+    def _strings(self, field: Text, i: int) -> Tuple[Text, ...]:
+        pointers, ids = self._fields[field]
+        return tuple(self._kb.string(ids[j]) for j in range(pointers[i], pointers[i + 1]))
+
+    def __getitem__(self, i: Any) -> Any:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Ailment(
+            i,
+            self.name(i),
+            self._strings("symptoms", i),
+            self._strings("treatments", i),
+            self._strings("medications", i),
+            self._kb.string(self._table[3 * i + 1]),
+            self._kb.string(self._table[3 * i + 2]),
+            self._strings("prevention", i),
+        )
+
+
+class KnowledgeBase:
+    """Zero-copy reader over a compiled knowledge base buffer"""
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap]):
+        self._buffer = memoryview(buffer)
+        magic, format_version, digest, count = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError("Not a compiled knowledge base of a supported format version.")
+        self.digest = digest
+        self._sections: Dict[Text, memoryview] = {}
+        for n in range(count):
+            name, offset, length = _SECTION.unpack_from(self._buffer, _HEADER.size + n * _SECTION.size)
+            self._sections[name.rstrip(b"\0").decode("ascii")] = self._buffer[offset:offset + length]
+
+        self._blob = self._sections["strings.blob"]
+        self._offsets = self._u32("strings.off")
+        self._decoded: List[Optional[Text]] = [None] * (len(self._offsets) - 1)
+
+        self.records = AilmentRecords(self)
+        self.ailment_ids: Dict[Text, int] = {self.records.name(i): i for i in range(len(self.records))}
+        self.ailments = AilmentsView(self)
+
+    @classmethod
+    def open(cls, path: Text = KB_ARTIFACT) -> "KnowledgeBase":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @property
+    def version(self) -> Text:
+        return self.digest.hex()[:12]
+
+    def _u32(self, name: Text) -> Sequence[int]:
+        view = self._sections[name].cast("I")
+        if sys.byteorder != "little":
+            view = array("I", view)
+            view.byteswap()
+        return view
+
+    def string(self, string_id: int) -> Text:
+        # Each table entry is decoded and interned once, so every record
+        # sharing a string shares one object.
+        text = self._decoded[string_id]
+        if text is None:
+            text = sys.intern(str(self._blob[self._offsets[string_id]:self._offsets[string_id + 1]], "utf-8"))
+            self._decoded[string_id] = text
+        return text
+
+    def _strings(self, name: Text) -> List[Text]:
+        return [self.string(string_id) for string_id in self._u32(name)]
+
+    def ailment(self, name: Text) -> Ailment:
+        return self.records[self.ailment_ids[name]]
+
+    @property
+    def emergency_symptoms(self) -> List[Text]:
+        return self._strings("emergency.sym")
+
+    @property
+    def emergency_keywords(self) -> List[Text]:
+        return self._strings("emergency.kw")
+
+    @property
+    def emergency_alert_phrases(self) -> List[Text]:
+        return self._strings("emergency.alert")
+
+    @property
+    def medication_info(self) -> Dict[Text, Dict[Text, Any]]:
+        ids = self._u32("medications")
+        pointers, aliases = self._u32("med.alias.ptr"), self._u32("med.alias.ids")
+        return {
+            self.string(ids[3 * n]): {
+                "dosage": self.string(ids[3 * n + 1]),
+                "notes": self.string(ids[3 * n + 2]),
+                "aliases": [self.string(aliases[j]) for j in range(pointers[n], pointers[n + 1])],
+            }
+            for n in range(len(ids) // 3)
+        }
+
+    @property
+    def indexed_symptoms(self) -> List[Text]:
+        """Distinct lowercased symptoms across all ailments, then their synonyms"""
+        return self._strings("index.sym")
+
+    def symptom_index(self, vocabulary: Optional[FuzzyVocabulary] = None) -> SymptomIndex:
+        """Build the symptom index from the postings precomputed at compile time"""
+        pointers, ids = self._u32("index.ptr"), self._u32("index.ail")
+        return SymptomIndex(
+            tuple(self.ailment_ids),
+            self._u32("index.count"),
+            self.indexed_symptoms,
+            [tuple(ids[pointers[i]:pointers[i + 1]]) for i in range(len(pointers) - 1)],
+            vocabulary,
+        )
+
+
+def load_knowledge_base(source: Text = KB_SOURCE, artifact: Text = KB_ARTIFACT) -> KnowledgeBase:
+    """Map the compiled artifact, recompiling it first if the source is newer"""
+    try:
+        if not os.path.exists(artifact) or (
+            os.path.exists(source) and os.path.getmtime(source) > os.path.getmtime(artifact)
+        ):
+            build_artifact(source, artifact)
+        return KnowledgeBase.open(artifact)
+    except ValueError:
+        build_artifact(source, artifact)
+        return KnowledgeBase.open(artifact)
+    except OSError:
+        # Read-only deployments still work, just without a shared mapping.
+        with open(source, "rb") as f:
+            digest = hashlib.sha256(f.read()).digest()
+        return KnowledgeBase(compile_kb(read_source(source), digest))
+
+
+def main(argv: Optional[List[Text]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compile the student health knowledge base.")
+    parser.add_argument("source", nargs="?", default=KB_SOURCE)
+    parser.add_argument("artifact", nargs="?", default=KB_ARTIFACT)
+    args = parser.parse_args(argv)
+
+    build_artifact(args.source, args.artifact)
+    kb = KnowledgeBase.open(args.artifact)
+    print(f"Compiled {len(kb.ailments)} ailments into {args.artifact} (version {kb.version}).")
+
+    # The NLU gazetteer is only read at training time, so it is regenerated
+    # here rather than when the action server recompiles the artifact.
+    from .nlu_data import NLU_DATA, write
+
+    if write(args.source):
+        print(f"Regenerated {NLU_DATA}; retrain the model to use it.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import logging
+import os
+import threading
+from typing import Callable, Optional, Text, Tuple
+
+from .emergency import EmergencyDetector
+from .fuzzy import FuzzyVocabulary
+from .kb import KB_ARTIFACT, KB_SOURCE, KnowledgeBase, load_knowledge_base
+from .medications import MedicationCatalog
+from .profiles import AilmentProfiles
+from .responses import ResponseRenderer
+from .scoring import ScoringEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RELOAD_INTERVAL = 5.0
+RELOAD_INTERVAL = float(os.environ.get("HEALTH_KB_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL))
+
+
+class KnowledgeSnapshot:
+    """One knowledge base version together with every structure derived from it
+
+    Snapshots are never modified after construction. Readers take a
+    reference to the current snapshot once per request and use only that,
+    so a reload swapping in a new snapshot can never mix versions.
+
+    Only the compiled artifact is shared between processes. The n-gram
+    postings, the fuzzy vocabulary, the emergency automaton and the
+    rendered responses are Python objects private to the process that
+    builds the snapshot. ``python -m actions.supervisor`` builds every
+    snapshot, including reloaded ones, before forking the workers, so they
+    share those pages copy-on-write. ``rasa run actions`` has every worker
+    process build and reload its own, so N workers hold N copies.
+    """
+
+    def __init__(self, kb: KnowledgeBase):
+        self.kb = kb
+        self.version = kb.version
+        self.records = kb.records
+        self.ailment_ids = kb.ailment_ids
+        self.ailments = kb.ailments
+        self.emergency_symptoms = kb.emergency_symptoms
+        self.emergency_keywords = kb.emergency_keywords
+        self.emergency_alert_phrases = kb.emergency_alert_phrases
+        self.medication_info = kb.medication_info
+        self.vocabulary = FuzzyVocabulary(kb.indexed_symptoms + self.emergency_symptoms)
+        self.symptom_index = kb.symptom_index(self.vocabulary)
+        self.scorer = ScoringEngine(self.symptom_index)
+        self.profiles = AilmentProfiles(self.records)
+        self.emergency_detector = EmergencyDetector(
+            self.emergency_symptoms, self.emergency_keywords, self.vocabulary,
+            alert_phrases=self.emergency_alert_phrases,
+        )
+        self.medications = MedicationCatalog(self.medication_info, self.records)
+        self.responses = ResponseRenderer(self.records, self.medications)
+        self.responses.warm()
+
+
+class KnowledgeBaseWatcher(threading.Thread):
+    """Polls the knowledge base files and publishes a new snapshot on change
+
+    The new snapshot, including its indexes and pre-rendered responses, is
+    fully built on this thread before ``publish`` is called, so request
+    handlers never wait for a reload.
+    """
+
+    def __init__(self, current: KnowledgeSnapshot,
+                 publish: Callable[[KnowledgeSnapshot], None],
+                 source: Text = KB_SOURCE, artifact: Text = KB_ARTIFACT,
+                 interval: float = RELOAD_INTERVAL):
+        super().__init__(name="kb-watcher", daemon=True)
+        self.current = current
+        self.publish = publish
+        self.source = source
+        self.artifact = artifact
+        self.interval = interval
+        self._signature = self._stat()
+        self._stopped = threading.Event()
+
+    def _stat(self) -> Tuple[Optional[float], Optional[float], Optional[int]]:
+        def mtime(path: Text) -> Optional[float]:
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                return None
+
+        try:
+            inode = os.stat(self.artifact).st_ino
+        except OSError:
+            inode = None
+        return mtime(self.source), mtime(self.artifact), inode
+
+    def check(self) -> bool:
+        """Reload if the files changed; return whether a new version was published"""
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        try:
+            kb = load_knowledge_base(self.source, self.artifact)
+            if kb.digest == self.current.kb.digest:
+                return False
+            snapshot = KnowledgeSnapshot(kb)
+        except Exception:
+            logger.exception("Failed to reload the knowledge base, keeping version %s.",
+                             self.current.version)
+            return False
+        finally:
+            self._signature = self._stat()
+
+        logger.info("Knowledge base reloaded: %s -> %s.", self.current.version, snapshot.version)
+        self.current = snapshot
+        self.publish(snapshot)
+        return True
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -0,0 +1,65 @@
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Sequence, Text, Tuple
+
+from .kb import Ailment
+
+
+class MedicationRecord(NamedTuple):
+    name: Text
+    dosage: Text
+    notes: Text
+
+
+def normalize_medication(name: Text) -> Text:
+    return " ".join(name.lower().split())
+
+
+class MedicationCatalog:
+    """Immutable medication lookup built once per knowledge base version
+
+    ``names`` maps every normalized drug name and alias to its dosage
+    record. Every medication string referenced by an ailment is resolved
+    when the catalog is built, so serving a medication guide is a plain
+    tuple walk and looking up any known name is a single dict access.
+    """
+
+    def __init__(self, medication_info: Mapping[Text, Dict[Text, Any]],
+                 records: Sequence[Ailment]):
+        names: Dict[Text, MedicationRecord] = {}
+        for key, info in medication_info.items():
+            record = MedicationRecord(key, info["dosage"], info["notes"])
+            for name in (key, *info.get("aliases", ())):
+                names.setdefault(normalize_medication(name), record)
+        self.names: Mapping[Text, MedicationRecord] = MappingProxyType(names)
+
+        referenced: Dict[Text, Optional[MedicationRecord]] = {}
+        by_ailment: Dict[Text, Tuple[Tuple[Text, Optional[MedicationRecord]], ...]] = {}
+        for record in records:
+            entries = []
+            for medication in record.medications:
+                key = normalize_medication(medication)
+                if key not in referenced:
+                    referenced[key] = self._resolve(key)
+                entries.append((medication, referenced[key]))
+            by_ailment[record.name] = tuple(entries)
+        self.referenced: Mapping[Text, Optional[MedicationRecord]] = MappingProxyType(referenced)
+        self._by_ailment = MappingProxyType(by_ailment)
+
+    def _resolve(self, key: Text) -> Optional[MedicationRecord]:
+        # Entries such as "Paracetamol 500mg" or "Loperamide for diarrhea"
+        # name a known drug inside a longer phrase.
+        if key in self.names:
+            return self.names[key]
+        for name, record in self.names.items():
+            if name in key:
+                return record
+        return None
+
+    def lookup(self, name: Text) -> Optional[MedicationRecord]:
+        """Dosage record for a drug name, alias or KB medication entry"""
+        key = normalize_medication(name)
+        return self.names.get(key) or self.referenced.get(key)
+
+    def for_ailment(self, ailment: Text) -> Tuple[Tuple[Text, Optional[MedicationRecord]], ...]:
+        """The ailment's medications, each paired with its record if one is known"""
+        return self._by_ailment[ailment]
@@ -0,0 +1,306 @@
+"""Opt-in latency and hot-path instrumentation for the action server.
+
+Collection is off unless ``HEALTH_METRICS=1``. When it is off, ``timed``
+returns the decorated function unchanged and ``stage`` returns a shared
+no-op context manager, so uninstrumented servers pay nothing. When it is on,
+each observation is a ``perf_counter_ns`` pair, a bisect into fixed buckets
+and an increment in a per-thread shard.
+
+Metrics are exported by either or both of:
+
+* ``HEALTH_METRICS_PORT``: a Prometheus text endpoint on
+  ``http://127.0.0.1:<port>/metrics``;
+* ``HEALTH_METRICS_DUMP``: a JSON file rewritten every
+  ``HEALTH_METRICS_DUMP_INTERVAL`` seconds (default 60).
+
+The exporters start with the first action call in a process, not when the
+actions are imported.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, ContextManager, Dict, List, Text, Tuple
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("HEALTH_METRICS", "").lower() in ("1", "true", "yes")
+PORT = int(os.environ.get("HEALTH_METRICS_PORT", "0"))
+DUMP_PATH = os.environ.get("HEALTH_METRICS_DUMP", "")
+DUMP_INTERVAL = float(os.environ.get("HEALTH_METRICS_DUMP_INTERVAL", "60"))
+
+# Histogram upper bounds in microseconds; the last bucket is unbounded.
+LATENCY_BUCKETS_US = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+_DISABLED = nullcontext()
+
+
+class Histogram:
+    __slots__ = ("counts", "total_us")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_US) + 1)
+        self.total_us = 0.0
+
+
+class _Shard:
+    """The metrics recorded by one thread, written without locking"""
+
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: Dict[Text, int] = {}
+        self.histograms: Dict[Text, Histogram] = {}
+
+
+class Metrics:
+    """Counters, latency histograms and tracker-size gauges for one process
+
+    Each thread records into its own shard, so the hot path takes no lock;
+    shards are only merged when a snapshot is exported. A call count is
+    the number of observations in its histogram.
+    """
+
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self.gauges: Dict[Text, float] = {}
+        self._shards: List[_Shard] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def increment(self, name: Text, value: int = 1) -> None:
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + value
+
+    def set_gauge(self, name: Text, value: float) -> None:
+        """Set a gauge and raise its ``_max`` companion if exceeded"""
+        self.gauges[name] = value
+        peak = f"{name}_max"
+        if value > self.gauges.get(peak, 0):
+            self.gauges[peak] = value
+
+    def observe(self, name: Text, elapsed_ns: int) -> None:
+        """Record one call of ``name`` that took ``elapsed_ns`` nanoseconds"""
+        histograms = self._shard().histograms
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        elapsed_us = elapsed_ns / 1000
+        histogram.counts[bisect_left(LATENCY_BUCKETS_US, elapsed_us)] += 1
+        histogram.total_us += elapsed_us
+
+    def stage(self, name: Text) -> ContextManager:
+        """Time the enclosed block as an internal stage, e.g. ``render``"""
+        if not self.enabled:
+            return _DISABLED
+        return _Stage(self, f"stage.{name}")
+
+    def timed(self, fn: Callable) -> Callable:
+        """Decorate an ``Action.run`` or validator to record its latency, calls,
+        errors and the number of events in the tracker it was given"""
+        if not self.enabled:
+            return fn
+
+        name = fn.__qualname__
+        parameters = list(inspect.signature(fn).parameters)
+        tracker_position = parameters.index("tracker") if "tracker" in parameters else None
+
+        errors, gauge = f"{name}.errors", f"{name}.tracker_events"
+
+        def record_tracker(args: Tuple[Any, ...], kwargs: Dict[Text, Any]) -> None:
+            tracker = kwargs.get("tracker")
+            if tracker is None and tracker_position is not None and len(args) > tracker_position:
+                tracker = args[tracker_position]
+            if tracker is not None:
+                self.set_gauge(gauge, len(tracker.events))
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                record_tracker(args, kwargs)
+                started = time.perf_counter_ns()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    self.increment(errors)
+                    raise
+                finally:
+                    self.observe(name, time.perf_counter_ns() - started)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            record_tracker(args, kwargs)
+            started = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                self.increment(errors)
+                raise
+            finally:
+                self.observe(name, time.perf_counter_ns() - started)
+
+        return wrapper
+
+    def snapshot(self) -> Dict[Text, Any]:
+        """A JSON-serializable merge of every thread's metrics"""
+        counters: Dict[Text, int] = {}
+        histograms: Dict[Text, Histogram] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for name, value in list(shard.counters.items()):
+                counters[name] = counters.get(name, 0) + value
+            for name, histogram in list(shard.histograms.items()):
+                merged = histograms.setdefault(name, Histogram())
+                merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                merged.total_us += histogram.total_us
+        for name, histogram in histograms.items():
+            counters[f"{name}.calls"] = sum(histogram.counts)
+        return {
+            "counters": counters,
+            "gauges": dict(self.gauges),
+            "histograms": {
+                name: {
+                    "buckets_us": list(LATENCY_BUCKETS_US) + ["+Inf"],
+                    "counts": h.counts,
+                    "count": sum(h.counts),
+                    "sum_us": round(h.total_us, 3),
+                }
+                for name, h in histograms.items()
+            },
+        }
+
+    def render_prometheus(self) -> Text:
+        """The current metrics in the Prometheus text exposition format"""
+        data = self.snapshot()
+        lines: List[Text] = []
+        for kind, values in (("counter", data["counters"]), ("gauge", data["gauges"])):
+            families: Dict[Text, List[Text]] = {}
+            for name, value in sorted(values.items()):
+                metric, label = _split(name)
+                if kind == "counter":
+                    metric += "_total"
+                families.setdefault(metric, []).append(f'health_{metric}{{name="{label}"}} {value}')
+            for metric, samples in families.items():
+                lines.append(f"# TYPE health_{metric} {kind}")
+                lines.extend(samples)
+        if data["histograms"]:
+            lines.append("# TYPE health_latency_seconds histogram")
+        for name, h in sorted(data["histograms"].items()):
+            cumulative = 0
+            for bound, count in zip(h["buckets_us"], h["counts"]):
+                cumulative += count
+                le = bound if bound == "+Inf" else bound / 1e6
+                lines.append(f'health_latency_seconds_bucket{{name="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'health_latency_seconds_sum{{name="{name}"}} {h["sum_us"] / 1e6}')
+            lines.append(f'health_latency_seconds_count{{name="{name}"}} {h["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Text) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics: Metrics, name: Text):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.metrics.observe(self.name, time.perf_counter_ns() - self.started)
+
+
+def _split(name: Text) -> Tuple[Text, Text]:
+    # "ActionCheckEmergency.run.calls" -> ("calls", "ActionCheckEmergency.run")
+    label, _, metric = name.rpartition(".")
+    return metric, label
+
+
+def serve(metrics: Metrics, port: int = PORT) -> ThreadingHTTPServer:
+    """Serve ``/metrics`` on localhost from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] == "/metrics":
+                body, content_type = metrics.render_prometheus(), "text/plain; version=0.0.4"
+            elif self.path.split("?")[0] == "/metrics.json":
+                body, content_type = json.dumps(metrics.snapshot()), "application/json"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: Text, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Serving action metrics on http://127.0.0.1:%s/metrics.", server.server_port)
+    return server
+
+
+class MetricsDumper(threading.Thread):
+    """Periodically writes the metrics snapshot to a JSON file"""
+
+    def __init__(self, metrics: Metrics, path: Text = DUMP_PATH, interval: float = DUMP_INTERVAL):
+        super().__init__(name="metrics-dump", daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.metrics.dump(self.path)
+            except OSError:
+                logger.exception("Failed to write action metrics to %s.", self.path)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+def start_exporters(metrics: Metrics) -> None:
+    """Start whichever exporters the environment configures"""
+    if not metrics.enabled:
+        return
+    if PORT:
+        try:
+            serve(metrics, PORT)
+        except OSError:
+            logger.exception("Could not serve action metrics on port %s.", PORT)
+    if DUMP_PATH:
+        MetricsDumper(metrics).start()
+
+
+METRICS = Metrics()
@@ -0,0 +1,179 @@
+"""NLU training data generated from the knowledge base.
+
+``data/kb_entities.yml`` gives the ``symptom``, ``medication`` and
+``ailment`` entities a gazetteer built from ``knowledge_base/student_health.yml``,
+so DIET sees every KB symptom spelled out instead of only the ones in the
+hand-written examples:
+
+* a lookup table per entity with the KB entries and their variants
+* the same vocabulary as one regex per entity for the ``RegexFeaturizer``.
+  Rasa turns a lookup table into one alternative per entry, which is tried
+  entry by entry at every position; the generated regex is compiled from a
+  trie of the entries instead, so a position is given up after its first
+  character unless some entry starts with it.
+* ``EntitySynonymMapper`` synonyms mapping the variants back to the KB
+  spelling: ``symptom_synonyms`` from the knowledge base, singulars of
+  plural symptoms, medication aliases and ailment names written with spaces
+
+The file is rewritten by ``python -m actions.kb``. Run::
+
+    python -m actions.nlu_data --check
+
+to fail when it is out of date with the knowledge base.
+"""
+
+import argparse
+import os
+import re
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Text
+
+from .kb import KB_SOURCE, read_source
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+NLU_DATA = os.path.join(DATA_DIR, "kb_entities.yml")
+
+_HEADER = """\
+# Generated from knowledge_base/student_health.yml by `python -m actions.kb`.
+# Do not edit; edit the knowledge base and regenerate.
+"""
+
+_END = ""
+
+
+def _trie(phrases: Iterable[Text]) -> Dict[Text, Any]:
+    root: Dict[Text, Any] = {}
+    for phrase in phrases:
+        node = root
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[_END] = {}
+    return root
+
+
+def _pattern(node: Dict[Text, Any]) -> Text:
+    alternatives = [
+        (r"\s+" if char == " " else re.escape(char)) + _pattern(child)
+        for char, child in sorted(node.items()) if char != _END
+    ]
+    if not alternatives:
+        return ""
+    optional = _END in node
+    if len(alternatives) == 1 and not optional:
+        return alternatives[0]
+    if len(alternatives) == 1 and re.fullmatch(r"\\?.", alternatives[0]):
+        return alternatives[0] + "?"
+    group = "(?:" + "|".join(alternatives) + ")"
+    return group + "?" if optional else group
+
+
+def trie_regex(phrases: Iterable[Text]) -> Text:
+    """One word-bounded regex matching any of the (lower case) phrases
+
+    Shared prefixes are factored out, so "stomach cramps" and "stomach
+    pain" become ``stomach\\s+(?:cramps|pain)``. Spaces match any run of
+    whitespace; the ``RegexFeaturizer`` matches case-insensitively.
+    """
+    return r"\b" + _pattern(_trie(phrases)) + r"\b"
+
+
+def _singular(phrase: Text) -> Optional[Text]:
+    # "body aches" -> "body ache"; "dizziness" and "nausea" stay as they are.
+    if len(phrase) > 3 and phrase.endswith("s") and not phrase.endswith(("ss", "us", "is")):
+        return phrase[:-1]
+    return None
+
+
+def _lower(values: Iterable[Text]) -> List[Text]:
+    return [" ".join(value.lower().split()) for value in values]
+
+
+def entities(data: Dict[Text, Any]) -> Dict[Text, Dict[Text, List[Text]]]:
+    """Canonical value -> variants per entity; every canonical value is its own first variant"""
+    symptoms: Dict[Text, List[Text]] = {}
+    for record in data["ailments"].values():
+        for symptom in _lower(record["symptoms"]):
+            symptoms.setdefault(symptom, [symptom])
+    for symptom in _lower(data.get("emergency_symptoms", ())):
+        symptoms.setdefault(symptom, [symptom])
+
+    for symptom, variants in (data.get("symptom_synonyms") or {}).items():
+        symptom = " ".join(symptom.lower().split())
+        if symptom not in symptoms:
+            raise ValueError(f"symptom_synonyms: '{symptom}' is not a symptom of any ailment")
+        for variant in _lower(variants):
+            if variant in symptoms:
+                raise ValueError(f"symptom_synonyms: '{variant}' is a symptom of its own")
+            symptoms[symptom].append(variant)
+    for symptom in list(symptoms):
+        singular = _singular(symptom)
+        if singular and singular not in symptoms and all(singular not in v for v in symptoms.values()):
+            symptoms[symptom].append(singular)
+
+    medications = {
+        name.lower(): _lower([name, *info.get("aliases", ())])
+        for name, info in data["medication_info"].items()
+    }
+    ailments = {
+        name: list(dict.fromkeys([name, name.replace("_", " ")]))
+        for name in data["ailments"]
+    }
+    return {"symptom": symptoms, "medication": medications, "ailment": ailments}
+
+
+def _examples(values: Iterable[Text]) -> List[Text]:
+    return ["    examples: |"] + [f"      - {value}" for value in values]
+
+
+def render(data: Dict[Text, Any]) -> Text:
+    """``kb_entities.yml`` for a parsed knowledge base"""
+    lines = [_HEADER, 'version: "3.1"', "", "nlu:"]
+    generated = entities(data)
+    for entity, values in generated.items():
+        vocabulary = sorted({variant for variants in values.values() for variant in variants})
+        lines += [f"  - lookup: {entity}", *_examples(vocabulary), ""]
+        lines += [f"  - regex: {entity}", *_examples([trie_regex(vocabulary)]), ""]
+    for values in generated.values():
+        for canonical, variants in values.items():
+            if variants[1:]:
+                lines += [f"  - synonym: {canonical}", *_examples(variants[1:]), ""]
+    return "\n".join(lines)
+
+
+def write(source: Text = KB_SOURCE, path: Text = NLU_DATA) -> bool:
+    """Regenerate the training data; True if the file changed"""
+    rendered = render(read_source(source))
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == rendered:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(rendered)
+    return True
+
+
+def main(argv: Optional[List[Text]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate NLU lookups, regexes and synonyms from the knowledge base.")
+    parser.add_argument("source", nargs="?", default=KB_SOURCE)
+    parser.add_argument("output", nargs="?", default=NLU_DATA)
+    parser.add_argument("--check", action="store_true", help="Fail instead of writing if the output is stale.")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        try:
+            with open(args.output, encoding="utf-8") as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != render(read_source(args.source)):
+            print(f"{args.output} is out of date; run `python -m actions.kb`.", file=sys.stderr)
+            sys.exit(1)
+        return
+    changed = write(args.source, args.output)
+    print(f"{'Wrote' if changed else 'Unchanged:'} {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
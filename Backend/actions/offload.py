@@ -0,0 +1,55 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+SCORING_WORKERS = int(os.environ.get("HEALTH_SCORING_WORKERS", str(min(4, os.cpu_count() or 1))))
+SCORING_QUEUE = int(os.environ.get("HEALTH_SCORING_QUEUE", "64"))
+# Tracker scans over fewer new events than this are cheaper than a thread hop.
+INLINE_SCAN_EVENTS = int(os.environ.get("HEALTH_INLINE_SCAN_EVENTS", "64"))
+
+
+class BoundedExecutor:
+    """Runs CPU-bound work off the event loop with bounded concurrency
+
+    At most ``workers`` jobs run at once and at most ``queue`` more wait for
+    a worker; further callers wait on the event loop instead of piling work
+    into the pool, so a burst of slow requests cannot grow memory without
+    limit. Coroutines waiting here do not block other conversations.
+    """
+
+    def __init__(self, workers: int = SCORING_WORKERS, queue: int = SCORING_QUEUE):
+        self.workers = workers
+        self.queue = queue
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind(self) -> asyncio.Semaphore:
+        # Created lazily so importing the actions package starts no threads,
+        # and rebound if the server runs a new event loop.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.workers + self.queue)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="scoring")
+        return self._slots
+
+    async def run(self, fn: Callable[..., T], *args: Any, inline: bool = False) -> T:
+        """Call ``fn(*args)`` on a worker thread, or directly if ``inline``"""
+        if inline or self.workers <= 0:
+            return fn(*args)
+        slots = self._bind()
+        async with slots:
+            return await self._loop.run_in_executor(self._pool, fn, *args)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+SCORING = BoundedExecutor()
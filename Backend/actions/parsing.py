@@ -0,0 +1,249 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Text, Tuple
+
+HOURS_PER_UNIT = {
+    "minute": 1 / 60,
+    "hour": 1.0,
+    "day": 24.0,
+    "week": 168.0,
+    "month": 730.0,
+    "year": 8760.0,
+}
+
+UNIT_SPELLINGS = {
+    "minute": ("minutes", "minute", "mins", "min"),
+    "hour": ("hours", "hour", "hrs", "hr", "h"),
+    "day": ("days", "day", "d"),
+    "week": ("weeks", "week", "wks", "wk", "w"),
+    "month": ("months", "month", "mos", "mo"),
+    "year": ("years", "year", "yrs", "yr", "y"),
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "fourteen": 14, "twenty": 20, "thirty": 30, "forty eight": 48, "twenty four": 24,
+    "half a": 0.5, "half an": 0.5, "a couple of": 2, "a couple": 2, "couple of": 2,
+    "a few": 3, "few": 3, "several": 4,
+}
+
+# Hours elapsed since a point in time the user names instead of a length.
+ANCHOR_HOURS = {
+    "yesterday": 24.0,
+    "last night": 12.0,
+    "overnight": 12.0,
+    "this morning": 6.0,
+    "today": 6.0,
+    "this afternoon": 3.0,
+    "this evening": 2.0,
+    "tonight": 2.0,
+    "the other day": 72.0,
+    "last week": 168.0,
+    "last month": 730.0,
+    "last year": 8760.0,
+}
+
+# Spans, in hours, for durations the knowledge base gives only as a unit
+# ("minutes to hours") or as a kind of course ("chronic condition").
+UNIT_SPANS = {
+    "minute": (1 / 60, 1.0),
+    "hour": (1.0, 24.0),
+    "day": (24.0, 168.0),
+    "week": (168.0, 730.0),
+    "month": (730.0, 8760.0),
+    "year": (8760.0, 87600.0),
+}
+CHRONIC = (720.0, 87600.0)
+# "A while ago": anything from an hour to a week.
+A_WHILE = (1.0, 168.0)
+
+SEVERITY_LEVELS = ("mild", "moderate", "severe")
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+SEVERITY_WORDS = {
+    "mild": (
+        "mild", "mildly", "slight", "slightly", "minor", "a little", "a bit",
+        "manageable", "bearable", "tolerable", "not bad", "not too bad", "not that bad",
+        "not very bad", "not so bad", "not severe", "not serious",
+    ),
+    "moderate": (
+        "moderate", "moderately", "medium", "average", "noticeable", "somewhat",
+        "fairly bad", "quite bad", "pretty bad", "kind of bad", "kinda bad", "uncomfortable",
+    ),
+    "severe": (
+        "severe", "severely", "serious", "very bad", "really bad", "extreme", "extremely",
+        "terrible", "horrible", "awful", "unbearable", "excruciating", "intense",
+        "agonizing", "agonising", "worst", "killing me",
+    ),
+}
+
+
+def _alternation(phrases) -> Text:
+    # Longest first, so "not too bad" wins over "bad" and "a few" over "a".
+    return "|".join(
+        re.escape(phrase).replace(r"\ ", r"\s+")
+        for phrase in sorted(phrases, key=len, reverse=True)
+    )
+
+
+# Digits may run into the unit ("36h"); number words must end at a word
+# boundary, so "and" is not read as "an d".
+_NUMBER = rf"(?:\d+(?:\.\d+)?|(?:{_alternation(NUMBER_WORDS)})\b)"
+_UNIT = _alternation(spelling for spellings in UNIT_SPELLINGS.values() for spelling in spellings)
+
+_PATTERN = re.compile(
+    rf"""
+    (?P<scale>\b(?P<rating>10|[0-9])\s*(?:/|out\s+of|of)\s*10\b)
+    | \b(?P<low>{_NUMBER})(?:\s*(?:-|–|to|or)\s*(?P<high>{_NUMBER}))?\s*(?P<unit>{_UNIT})\b
+    | \b(?P<anchor>{_alternation(ANCHOR_HOURS)})\b
+    | \b(?:since|on|last)\s+(?P<weekday>{_alternation(WEEKDAYS)})\b
+    | \b(?P<severity>{_alternation(w for words in SEVERITY_WORDS.values() for w in words)})\b
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+_UNITS: Dict[Text, float] = {
+    spelling: HOURS_PER_UNIT[unit] for unit, spellings in UNIT_SPELLINGS.items() for spelling in spellings
+}
+_SEVERITIES: Dict[Text, Text] = {
+    word: severity for severity, words in SEVERITY_WORDS.items() for word in words
+}
+
+
+def _words(text: Text) -> Text:
+    return " ".join(text.lower().split())
+
+
+def _number(text: Text) -> float:
+    text = _words(text)
+    return float(NUMBER_WORDS[text]) if text in NUMBER_WORDS else float(text)
+
+
+class Duration(NamedTuple):
+    """A duration as a range of hours; a single value has ``low == high``"""
+
+    low: float
+    high: float
+
+    @property
+    def hours(self) -> float:
+        return (self.low + self.high) / 2
+
+
+class SymptomDetails(NamedTuple):
+    duration: Optional[Duration]
+    severity: Optional[Text]
+
+
+def parse_details(text: Text, now: Optional[datetime] = None) -> SymptomDetails:
+    """Find the first duration and the first severity in free text in one pass
+
+    Understands lengths ("36h", "2-3 days", "a couple of weeks ago"), points
+    in time ("since yesterday", "since tuesday"), severity words ("pretty
+    bad", "not too bad") and ratings out of ten ("7/10").
+    """
+    return _parse_details(text, (now or datetime.now()).weekday())
+
+
+@lru_cache(maxsize=4096)
+def _parse_details(text: Text, today: int) -> SymptomDetails:
+    # Replies repeat a lot ("2 days", "mild"), so results are cached per
+    # weekday, the only outside input.
+    duration: Optional[Duration] = None
+    severity: Optional[Text] = None
+    for match in _PATTERN.finditer(text):
+        if duration is None:
+            if match.group("unit"):
+                per_unit = _UNITS[match.group("unit").lower()]
+                low = _number(match.group("low")) * per_unit
+                high = _number(match.group("high")) * per_unit if match.group("high") else low
+                duration = Duration(min(low, high), max(low, high))
+            elif match.group("anchor"):
+                hours = ANCHOR_HOURS[_words(match.group("anchor"))]
+                duration = Duration(hours, hours)
+            elif match.group("weekday"):
+                days = (today - WEEKDAYS.index(match.group("weekday").lower())) % 7 or 7
+                duration = Duration(days * 24.0, days * 24.0)
+        if severity is None:
+            if match.group("scale"):
+                rating = int(match.group("rating"))
+                severity = "mild" if rating <= 3 else "moderate" if rating <= 6 else "severe"
+            elif match.group("severity"):
+                severity = _SEVERITIES[_words(match.group("severity"))]
+        if duration is not None and severity is not None:
+            break
+    return SymptomDetails(duration, severity)
+
+
+def parse_duration(text: Text, now: Optional[datetime] = None) -> Optional[Duration]:
+    """Parse a duration reply, falling back to loose wording
+
+    A reply without a length still counts if it names a unit ("for days",
+    "weeks", taken as that unit's span) or says "ago" or "a while" (taken as
+    ``A_WHILE``), which is what the duration form has always accepted.
+    """
+    duration = parse_details(text, now).duration
+    if duration:
+        return duration
+    match = _UNIT_ANYWHERE.search(text)
+    if match:
+        return _unit_span(match)
+    if _VAGUE.search(text):
+        return Duration(*A_WHILE)
+    return None
+
+
+def parse_severity(text: Text) -> Optional[Text]:
+    return parse_details(text).severity
+
+
+_RANGE_SEPARATOR = re.compile(r"\s+to\s+", re.IGNORECASE)
+_UNIT_ONLY = re.compile(rf"^(?:(?P<few>a\s+few|few)\s+)?(?P<unit>{_UNIT})\b", re.IGNORECASE)
+# A unit named anywhere in a reply; plurals may sit inside a longer word,
+# as they could for the substring check this replaces.
+_LONG_UNIT = _alternation(HOURS_PER_UNIT)
+_UNIT_ANYWHERE = re.compile(
+    rf"(?:\b(?P<few>a\s+few|few)\s+)?(?P<unit>(?:{_LONG_UNIT})(?=s)|\b(?:{_LONG_UNIT})\b)",
+    re.IGNORECASE,
+)
+_VAGUE = re.compile(r"ago|\ba\s+while\b", re.IGNORECASE)
+
+
+def _unit_span(match: "re.Match[Text]") -> Duration:
+    per_unit = _UNITS[match.group("unit").lower()]
+    if match.group("few"):
+        hours = NUMBER_WORDS["few"] * per_unit
+        return Duration(hours, hours)
+    return Duration(*next(span for key, span in UNIT_SPANS.items() if HOURS_PER_UNIT[key] == per_unit))
+
+
+def _span(part: Text) -> Optional[Duration]:
+    duration = parse_details(part).duration
+    if duration:
+        return duration
+    match = _UNIT_ONLY.match(part.strip())
+    return _unit_span(match) if match else None
+
+
+def parse_typical_duration(text: Text) -> Optional[Duration]:
+    """Parse a knowledge base course such as "4-72 hours", "Few days to weeks"
+    or "Chronic condition" into a range of hours; None if it gives no length"""
+    if "chronic" in text.lower():
+        return Duration(*CHRONIC)
+    parts = [_span(part) for part in _RANGE_SEPARATOR.split(text)]
+    if not parts or not all(parts):
+        return None
+    return Duration(min(p.low for p in parts), max(p.high for p in parts))
+
+
+def parse_severity_range(text: Text) -> Optional[Tuple[int, int]]:
+    """Parse "mild to moderate" into (lowest, highest) indices of SEVERITY_LEVELS"""
+    levels = [
+        SEVERITY_LEVELS.index(severity)
+        for severity in (parse_severity(part) for part in _RANGE_SEPARATOR.split(text))
+        if severity
+    ]
+    return (min(levels), max(levels)) if levels else None
@@ -0,0 +1,76 @@
+import math
+from functools import lru_cache
+from typing import List, Optional, Sequence, Text, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships with rasa, not with rasa_sdk
+    np = None
+
+from .kb import Ailment
+from .parsing import (
+    SEVERITY_LEVELS,
+    Duration,
+    parse_severity,
+    parse_severity_range,
+    parse_typical_duration,
+)
+
+NEUTRAL = 0.5
+
+
+class AilmentProfiles:
+    """Typical course and severity of every ailment as numeric ranges
+
+    The knowledge base strings ("4-72 hours", "mild to moderate") are parsed
+    once per snapshot. Ailments without a ``severity`` entry fall back to
+    the severity words in their symptoms ("severe flank pain"). ``fit``
+    rates how well a reported duration and severity match each ailment,
+    from 0 to 1, with 0.5 wherever either side is unknown.
+    """
+
+    def __init__(self, records: Sequence[Ailment]):
+        self.durations: List[Optional[Duration]] = []
+        self.severities: List[Optional[Tuple[int, int]]] = []
+        for record in records:
+            self.durations.append(parse_typical_duration(record.duration))
+            severity = parse_severity_range(record.severity)
+            if severity is None:
+                levels = [
+                    SEVERITY_LEVELS.index(level)
+                    for level in map(parse_severity, record.symptoms) if level
+                ]
+                severity = (min(levels), max(levels)) if levels else None
+            self.severities.append(severity)
+        self.fit = lru_cache(maxsize=1024)(self._fit)
+
+    def _duration_fit(self, hours: float) -> List[float]:
+        # Full marks inside the typical range, falling to zero one order of
+        # magnitude outside it.
+        reported = math.log10(max(hours, 1 / 60))
+        fits = []
+        for duration in self.durations:
+            if duration is None:
+                fits.append(NEUTRAL)
+                continue
+            distance = max(0.0, math.log10(duration.low) - reported, reported - math.log10(duration.high))
+            fits.append(max(0.0, 1.0 - distance))
+        return fits
+
+    def _severity_fit(self, level: int) -> List[float]:
+        return [
+            NEUTRAL if severity is None else 1.0 - max(0, severity[0] - level, level - severity[1]) / 2
+            for severity in self.severities
+        ]
+
+    def _fit(self, hours: Optional[float], severity: Optional[Text]) -> Optional[Sequence[float]]:
+        """Per-ailment fit to the reported duration (hours) and severity level"""
+        if hours is None and severity not in SEVERITY_LEVELS:
+            return None
+        neutral = [NEUTRAL] * len(self.durations)
+        duration_fit = self._duration_fit(hours) if hours is not None else neutral
+        severity_fit = (
+            self._severity_fit(SEVERITY_LEVELS.index(severity)) if severity in SEVERITY_LEVELS else neutral
+        )
+        fits = [(d + s) / 2 for d, s in zip(duration_fit, severity_fit)]
+        return np.asarray(fits) if np is not None else fits
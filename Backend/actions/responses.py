@@ -0,0 +1,123 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Text
+
+from .kb import Ailment
+from .medications import MedicationCatalog
+
+
+SEVERITY_NOTES = {
+    "severe": (
+        "\n⚠️ **Note:** Since you rated your symptoms as severe, "
+        "consider seeking medical attention sooner rather than later.\n"
+    ),
+    "mild": (
+        "\n📝 **Note:** Your symptoms are mild, so home remedies may be sufficient. "
+        "Monitor your condition and seek help if symptoms worsen.\n"
+    ),
+}
+
+SEE_A_DOCTOR = (
+    "\n⚠️ **When to see a doctor:**\n"
+    "• Symptoms worsen or don't improve after expected duration\n"
+    "• High fever (>101.3°F/38.5°C)\n"
+    "• Severe pain or discomfort\n"
+    "• Signs of complications\n"
+)
+
+MEDICATION_SAFETY = (
+    "⚠️ **Important Safety Information:**\n"
+    "• Always read labels and follow dosage instructions\n"
+    "• Don't exceed maximum daily doses\n"
+    "• Check for drug interactions\n"
+    "• Consult pharmacist if unsure\n"
+    "• Stop and seek help if adverse reactions occur\n"
+)
+
+
+def display_name(ailment: Text) -> Text:
+    return ailment.replace("_", " ").title()
+
+
+class ResponseRenderer:
+    """Memoized markdown bodies for the ailment-specific responses
+
+    Every message depends only on the ailment record (and, for treatments,
+    the severity), so each one is rendered once and then served from a
+    bounded LRU cache.
+    """
+
+    def __init__(self, records: Sequence[Ailment],
+                 medications: MedicationCatalog,
+                 maxsize: int = 4096):
+        # Records are looked up when a message is rendered, not kept.
+        self.records = records
+        self.ailment_ids: Dict[Text, int] = {record.name: record.id for record in records}
+        self.medications_catalog = medications
+        self.condition = lru_cache(maxsize=maxsize)(self._render_condition)
+        self.prevention = lru_cache(maxsize=maxsize)(self._render_prevention)
+        self.medications = lru_cache(maxsize=maxsize)(self._render_medications)
+        self._treatment = lru_cache(maxsize=maxsize)(self._render_treatment)
+
+    def treatment(self, ailment: Text, severity: Optional[Text] = None) -> Text:
+        # Only severities with a note of their own get a cache entry.
+        return self._treatment(ailment, severity if severity in SEVERITY_NOTES else None)
+
+    def warm(self) -> None:
+        """Render every ailment/severity combination ahead of the first request"""
+        for ailment in self.ailment_ids:
+            self.condition(ailment)
+            self.prevention(ailment)
+            self.medications(ailment)
+            for severity in (None, *SEVERITY_NOTES):
+                self._treatment(ailment, severity)
+
+    def clear(self) -> None:
+        for cached in (self.condition, self.prevention, self.medications, self._treatment):
+            cached.cache_clear()
+
+    @staticmethod
+    def differential(ailments: List[Text]) -> Text:
+        names = ", ".join(display_name(ailment) for ailment in ailments)
+        return f"\n🔍 **Other Possibilities:** {names}\n"
+
+    def _render_condition(self, ailment: Text) -> Text:
+        record = self.records[self.ailment_ids[ailment]]
+        parts = [
+            f"🩺 **Possible Condition: {display_name(ailment)}**\n\n",
+            f"🕒 **Typical Duration:** {record.duration}\n\n",
+            "📋 **Common Symptoms Include:**\n",
+        ]
+        parts.extend(f"• {symptom.capitalize()}\n" for symptom in record.symptoms[:5])
+        if len(record.symptoms) > 5:
+            parts.append(f"• And {len(record.symptoms) - 5} more symptoms\n")
+        return "".join(parts)
+
+    def _render_treatment(self, ailment: Text, severity: Optional[Text]) -> Text:
+        record = self.records[self.ailment_ids[ailment]]
+        parts = ["💊 **Recommended Treatments:**\n\n", "🏠 **Home Care:**\n"]
+        parts.extend(f"{i}. {treatment}\n" for i, treatment in enumerate(record.treatments, 1))
+        parts.append("\n💊 **Medications (Over-the-counter):**\n")
+        parts.extend(f"{i}. {medication}\n" for i, medication in enumerate(record.medications, 1))
+        parts.append(SEVERITY_NOTES.get(severity, ""))
+        parts.append(f"\n⏳ **Expected Recovery Time:** {record.duration}\n")
+        parts.append(SEE_A_DOCTOR)
+        return "".join(parts)
+
+    def _render_medications(self, ailment: Text) -> Text:
+        parts = ["💊 **Detailed Medication Guide:**\n\n"]
+        for medication, record in self.medications_catalog.for_ailment(ailment):
+            parts.append(f"💊 **{medication}**\n")
+            if record:
+                parts.append(f"   • Dosage: {record.dosage}\n")
+                parts.append(f"   • Notes: {record.notes}\n")
+            else:
+                parts.append("   • Follow package instructions or consult pharmacist\n")
+            parts.append("\n")
+        parts.append(MEDICATION_SAFETY)
+        return "".join(parts)
+
+    def _render_prevention(self, ailment: Text) -> Text:
+        record = self.records[self.ailment_ids[ailment]]
+        parts = [f"🛡️ **Prevention Tips for {display_name(ailment)}:**\n\n"]
+        parts.extend(f"{i}. {tip}\n" for i, tip in enumerate(record.prevention, 1))
+        return "".join(parts)
@@ -0,0 +1,109 @@
+from typing import Iterable, List, Optional, Sequence, Set, Text, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships with rasa, not with rasa_sdk
+    np = None
+
+from .symptom_index import SymptomIndex
+
+# Below this many (matched symptom, ailment) postings the plain dict scoring
+# of SymptomIndex is faster than building the numpy arrays. This is the
+# "scoring_crossover" recorded in benchmarks/baseline.json; the benchmark
+# reports when a new measurement disagrees.
+MIN_VECTOR_CANDIDATES = 102
+
+
+class ScoringEngine:
+    """Vectorized ailment scoring over a sparse symptom x ailment matrix
+
+    The knowledge base is held as a CSR matrix whose rows are KB symptoms
+    and whose columns are ailments. The user's symptoms become a sparse
+    0/1 matrix over the same symptoms, and one boolean sparse product gives,
+    per ailment, how many user symptoms hit it. The best ``k`` ailments are
+    then selected with ``argpartition`` instead of sorting every candidate.
+
+    The arrays only pay off for symptoms common to many ailments: with
+    fewer than ``min_candidates`` postings to add up, or without numpy, the
+    engine scores with :meth:`SymptomIndex.score_matches` instead.
+    """
+
+    def __init__(self, index: SymptomIndex, min_candidates: int = MIN_VECTOR_CANDIDATES):
+        self.index = index
+        self.min_candidates = min_candidates
+        self._lengths = [len(ids) for ids in index.symptom_ailments]
+        if np is None:
+            return
+        self._n_ailments = len(index.ailments)
+        self._counts = np.asarray(index.symptom_counts, dtype=np.float64)
+        self._indptr = np.zeros(len(index.symptom_ailments) + 1, dtype=np.int64)
+        np.cumsum(self._lengths, out=self._indptr[1:])
+        self._indices = np.fromiter(
+            (a for ids in index.symptom_ailments for a in ids), dtype=np.int64, count=int(self._indptr[-1])
+        )
+
+    def vectorize(self, matches: Sequence[Set[int]]) -> bool:
+        """Whether scoring the matches adds up ``min_candidates`` or more
+        (symptom, ailment) postings, so the numpy path is the faster one"""
+        if np is None:
+            return False
+        # Every matched symptom has at least one posting.
+        if sum(map(len, matches)) >= self.min_candidates:
+            return True
+        return sum(self._lengths[s] for symptom_ids in matches for s in symptom_ids) >= self.min_candidates
+
+    def scores(self, matches: Sequence[Set[int]]) -> "np.ndarray":
+        """Number of user symptoms matching each ailment, as a dense vector,
+        given the KB symptom ids each user symptom matched"""
+        rows, features = [], []
+        for row, matched in enumerate(matches):
+            rows.extend([row] * len(matched))
+            features.extend(matched)
+        if not features:
+            return np.zeros(self._n_ailments, dtype=np.int64)
+
+        features = np.asarray(features, dtype=np.int64)
+        starts = self._indptr[features]
+        lengths = self._indptr[features + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        ailments = self._indices[offsets + np.arange(int(lengths.sum()))]
+        # A user symptom counts once per ailment however many of its
+        # symptoms it matched: mark (row, ailment) hits, then count per column.
+        hits = np.zeros((len(matches), self._n_ailments), dtype=bool)
+        hits[np.repeat(np.asarray(rows, dtype=np.int64), lengths), ailments] = True
+        return hits.sum(axis=0)
+
+    def top_k(self, symptoms: Iterable[Text], k: int = 1,
+              fit: Optional[Sequence[float]] = None) -> List[Tuple[Text, int, float]]:
+        """Return up to k (ailment, score, match_percentage) tuples, best first
+
+        The order is the same as :meth:`SymptomIndex.rank`: score, then the
+        optional per-ailment profile ``fit``, then match percentage, then
+        knowledge base order.
+        """
+        matches = [self.index.matching_symptoms(text.lower()) for text in symptoms]
+        if not self.vectorize(matches):
+            return self.index.rank_scores(self.index.score_matches(matches), fit)[:k]
+        return self.top_k_vectorized(matches, k, fit)
+
+    def top_k_vectorized(self, matches: Sequence[Set[int]], k: int = 1,
+                         fit: Optional[Sequence[float]] = None) -> List[Tuple[Text, int, float]]:
+        """``top_k`` through the sparse product, given the KB symptom ids each
+        user symptom matched; needs numpy"""
+        scores = self.scores(matches)
+        matched = np.flatnonzero(scores)
+        if not len(matched) or k <= 0:
+            return []
+        if k < len(matched):
+            kth = scores[matched[np.argpartition(-scores[matched], k - 1)[k - 1]]]
+            matched = matched[scores[matched] >= kth]
+
+        percentages = (scores[matched] / self._counts[matched]) * 100
+        keys = (matched, -percentages, -scores[matched])
+        if fit is not None:
+            keys = (matched, -percentages, -np.asarray(fit)[matched], -scores[matched])
+        order = np.lexsort(keys)[:k]
+        return [
+            (self.index.ailments[matched[i]], int(scores[matched[i]]), float(percentages[i]))
+            for i in order
+        ]
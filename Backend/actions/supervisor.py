@@ -0,0 +1,481 @@
+"""Supervised multi-process action server.
+
+Run from the ``Backend`` directory instead of ``rasa run actions``::
+
+    python -m actions.supervisor --workers 4
+
+The supervisor builds the knowledge base and imports every action once,
+then forks the workers, so the snapshot, its indexes and the pre-rendered
+responses are shared copy-on-write instead of being rebuilt per process.
+Each worker runs the regular SDK action server on its own localhost port
+(``--worker-port`` and up).
+
+A front process listens on the ``action_endpoint`` port and forwards each
+webhook call to the worker that owns its ``sender_id``, so per-conversation
+caches such as the tracker scans stay warm. If the owner already has
+``--spill-after`` calls in flight, or is down, the call goes to the least
+busy worker instead. Crashed workers and a crashed front are restarted.
+
+When Rasa sends a ``domain_digest`` and leaves out domains the action
+server has seen (see ``addons.domain_digest``), the front keeps each domain
+it forwards, in memory and under ``HEALTH_DOMAIN_CACHE_DIR``. A worker that
+answers 449 because it has not seen the domain yet, or lost it in a
+restart, is sent the call again with the domain filled in.
+
+Knowledge base hot reload runs in the supervisor, not in the workers. A
+changed knowledge base is built into a new snapshot before any worker sees
+it, and the workers are then restarted one at a time so they fork from it
+and share it too. Each worker waits for the previous one to listen again,
+and finishes its calls in flight before it exits. The calls it would have
+received go to the others meanwhile. Restarted workers start with cold
+per-conversation caches.
+
+The metrics exporters run inside each worker. Worker ``i`` serves metrics
+on ``HEALTH_METRICS_PORT + i`` and dumps them to ``HEALTH_METRICS_DUMP.i``.
+"""
+
+import argparse
+import asyncio
+import gc
+import gzip
+import json
+import logging
+import os
+import re
+import signal
+import socket
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+logger = logging.getLogger(__name__)
+
+FRONT = -1
+# A process that dies sooner than this after starting is restarted with backoff.
+MIN_UPTIME = 1.0
+MAX_BACKOFF = 30.0
+# How often the supervisor reaps children and moves a rolling restart on.
+POLL_INTERVAL = 0.2
+DOMAIN_CACHE_DIR = os.environ.get(
+    "HEALTH_DOMAIN_CACHE_DIR", os.path.join(tempfile.gettempdir(), "health-action-domains")
+)
+
+# Quotes inside JSON strings are escaped, so these only match real keys.
+_SENDER_ID = re.compile(rb'"sender_id"\s*:\s*("(?:[^"\\]|\\.)*")')
+_DOMAIN_DIGEST = re.compile(rb'"domain_digest"\s*:\s*"([0-9A-Za-z]{1,128})"')
+_VALID_DIGEST = re.compile(r"[0-9A-Za-z]{1,128}")
+_MISSING_DOMAIN = re.compile(rb"HTTP/1\.[01] 449 ")
+
+_SERVICE_UNAVAILABLE = (
+    b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+)
+_LENGTH_REQUIRED = b"HTTP/1.1 411 Length Required\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+class DomainCache:
+    """Domains of the action calls forwarded so far, by digest
+
+    They are written to ``directory`` too, so a restarted front can still
+    fill them in.
+    """
+
+    def __init__(self, directory: Text = DOMAIN_CACHE_DIR):
+        self.directory = directory
+        self.domains: Dict[Text, bytes] = {}
+
+    def path(self, digest: Text) -> Text:
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, digest: Text) -> Optional[bytes]:
+        domain = self.domains.get(digest)
+        if domain is None and _VALID_DIGEST.fullmatch(digest):
+            try:
+                with open(self.path(digest), "rb") as f:
+                    domain = self.domains[digest] = f.read()
+            except OSError:
+                return None
+        return domain
+
+    def observe(self, body: bytes) -> None:
+        """Keep the domain of a call that carries one with a new digest"""
+        # Rasa puts the digest last; most calls stop at this check.
+        match = _DOMAIN_DIGEST.match(body, max(0, body.rfind(b'"domain_digest"')))
+        if match is None or match.group(1).decode("ascii") in self.domains or b'"domain"' not in body:
+            return
+        try:
+            call = json.loads(body)
+        except ValueError:
+            return
+        digest, domain = call.get("domain_digest"), call.get("domain")
+        if not isinstance(digest, str) or not _VALID_DIGEST.fullmatch(digest) or not isinstance(domain, dict):
+            return
+        encoded = json.dumps(domain, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.domains[digest] = encoded
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            partial = f"{self.path(digest)}.{os.getpid()}"
+            with open(partial, "wb") as f:
+                f.write(encoded)
+            os.replace(partial, self.path(digest))
+        except OSError:
+            logger.warning("Could not store domain %s in %s.", digest, self.directory, exc_info=True)
+        logger.info("Cached domain %s.", digest)
+
+    def fill(self, body: bytes) -> Optional[bytes]:
+        """The call with its domain filled in; None if it already has one
+        or the domain is not known"""
+        try:
+            call = json.loads(body)
+        except ValueError:
+            return None
+        digest = call.get("domain_digest") if isinstance(call, dict) else None
+        if "domain" in call or not isinstance(digest, str):
+            return None
+        domain = self.get(digest)
+        body = body.rstrip()
+        if domain is None or not body.endswith(b"}"):
+            return None
+        return body[:-1] + b',"domain":' + domain + b"}"
+
+
+class Front:
+    """Sticky, load-aware HTTP forwarding from one port to the workers
+
+    Each client connection carries one request; it is forwarded to a worker
+    with ``Connection: close`` and the worker's response is streamed back
+    unchanged. Only connection failures are retried on another worker, as
+    an action that started running must not run twice, and 449s, which
+    the SDK answers before running anything.
+    """
+
+    def __init__(self, worker_ports: List[int], spill_after: int, domains: Optional[DomainCache] = None):
+        self.worker_ports = worker_ports
+        self.spill_after = spill_after
+        self.in_flight = [0] * len(worker_ports)
+        self.domains = domains or DomainCache()
+
+    @staticmethod
+    def decode(headers: Dict[Text, Text], body: bytes) -> Optional[bytes]:
+        """The request body without its content encoding; None if it cannot be decoded"""
+        encoding = headers.get("content-encoding", "identity")
+        try:
+            if encoding == "gzip":
+                return gzip.decompress(body)
+            if encoding == "deflate":
+                return zlib.decompress(body)
+        except (OSError, zlib.error, EOFError):
+            return None
+        return body if encoding == "identity" else None
+
+    @staticmethod
+    def sender_id(body: bytes) -> Optional[Text]:
+        # Only the key is looked up: decoding the tracker and the domain of
+        # every call just to route it would cost the front more than the rest.
+        match = _SENDER_ID.search(body)
+        if match is None:
+            return None
+        try:
+            sender_id = json.loads(match.group(1))
+        except ValueError:
+            return None
+        return sender_id if isinstance(sender_id, str) else None
+
+    @staticmethod
+    def request(request_line: Text, lines: List[Text], body: bytes) -> bytes:
+        return "\r\n".join(
+            [request_line]
+            + [line for line in lines if line.partition(":")[0].strip().lower()
+               not in ("connection", "keep-alive", "content-length")]
+            + [f"Content-Length: {len(body)}", "Connection: close", "", ""]
+        ).encode("latin-1") + body
+
+    @staticmethod
+    async def send(upstream: Tuple[asyncio.StreamReader, asyncio.StreamWriter], request: bytes) -> bytes:
+        """Send a request upstream and return the first chunk of the response"""
+        reader, writer = upstream
+        writer.write(request)
+        await writer.drain()
+        return await reader.read(65536)
+
+    def candidates(self, sender_id: Optional[Text]) -> List[int]:
+        """Workers to try in order: the owner first unless it is too busy"""
+        by_load = sorted(range(len(self.worker_ports)), key=self.in_flight.__getitem__)
+        if sender_id is None:
+            return by_load
+        owner = zlib.crc32(sender_id.encode("utf-8")) % len(self.worker_ports)
+        others = [worker for worker in by_load if worker != owner]
+        if self.in_flight[owner] >= self.spill_after and others and (
+            self.in_flight[others[0]] < self.in_flight[owner]
+        ):
+            return others + [owner]
+        return [owner] + others
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            request_line, *lines = head[:-4].decode("latin-1").split("\r\n")
+            headers = {}
+            for line in lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if "chunked" in headers.get("transfer-encoding", ""):
+                writer.write(_LENGTH_REQUIRED)
+                await writer.drain()
+                writer.close()
+                return
+            body = await reader.readexactly(int(headers.get("content-length", "0")))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            writer.close()
+            return
+
+        # The workers are local, so calls are forwarded uncompressed.
+        decoded = self.decode(headers, body)
+        sender_id = None
+        if decoded is not None:
+            body = decoded
+            lines = [line for line in lines if line.partition(":")[0].strip().lower() != "content-encoding"]
+            sender_id = self.sender_id(body)
+            self.domains.observe(body)
+        forwarded = self.request(request_line, lines, body)
+
+        try:
+            for worker in self.candidates(sender_id):
+                try:
+                    upstream = await asyncio.open_connection("127.0.0.1", self.worker_ports[worker])
+                except OSError:
+                    continue
+                self.in_flight[worker] += 1
+                try:
+                    first = await self.send(upstream, forwarded)
+                    if decoded is not None and _MISSING_DOMAIN.match(first):
+                        filled = self.domains.fill(body)
+                        if filled is not None:
+                            upstream[1].close()
+                            upstream = await asyncio.open_connection("127.0.0.1", self.worker_ports[worker])
+                            first = await self.send(upstream, self.request(request_line, lines, filled))
+                    chunk = first
+                    while chunk:
+                        writer.write(chunk)
+                        await writer.drain()
+                        chunk = await upstream[0].read(65536)
+                finally:
+                    self.in_flight[worker] -= 1
+                    upstream[1].close()
+                return
+            writer.write(_SERVICE_UNAVAILABLE)
+        except OSError:
+            logger.debug("Connection dropped while forwarding.", exc_info=True)
+        finally:
+            try:
+                await writer.drain()
+            except OSError:
+                pass
+            writer.close()
+
+    async def serve(self, host: Text, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port, reuse_address=True)
+        logger.info("Action endpoint is up and running on http://%s:%s (%s workers).",
+                    host, port, len(self.worker_ports))
+        async with server:
+            await server.serve_forever()
+
+
+class Supervisor:
+    """Forks the front and the workers and restarts whichever exits"""
+
+    def __init__(self, executor: Any, workers: int, host: Text, port: int, worker_port: int,
+                 spill_after: int, reload_interval: float,
+                 metrics_port: Optional[int], metrics_dump: Optional[Text]):
+        self.executor = executor
+        self.worker_ports = [worker_port + i for i in range(workers)]
+        self.host = host
+        self.port = port
+        self.spill_after = spill_after
+        self.reload_interval = reload_interval
+        self.metrics_port = metrics_port
+        self.metrics_dump = metrics_dump
+        self.children: Dict[int, int] = {}
+        self.started: Dict[int, float] = {}
+        self.backoff: Dict[int, float] = {}
+        self.stopping = False
+        # Workers still running an older knowledge base, and the one being
+        # replaced with its old pid.
+        self.outdated: List[int] = []
+        self.replacing: Optional[Tuple[int, int]] = None
+
+    def _run_front(self) -> None:
+        asyncio.run(Front(self.worker_ports, self.spill_after).serve(self.host, self.port))
+
+    def _run_worker(self, index: int) -> None:
+        from rasa_sdk.endpoint import create_app
+
+        from .actions import StudentHealthDatabase
+        from .metrics import METRICS, MetricsDumper, serve
+
+        # The supervisor reloads the knowledge base and restarts the worker,
+        # and metrics get a port and a file per worker. Threads do not
+        # survive fork, so each worker starts its own exporters.
+        StudentHealthDatabase.start_background(0, exporters=False)
+        if METRICS.enabled and self.metrics_port:
+            serve(METRICS, self.metrics_port + index)
+        if METRICS.enabled and self.metrics_dump:
+            MetricsDumper(METRICS, f"{self.metrics_dump}.{index}").start()
+
+        app = create_app(self.executor)
+        app.run(host="127.0.0.1", port=self.worker_ports[index], single_process=True,
+                access_log=False, motd=False)
+
+    def spawn(self, slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                if slot == FRONT:
+                    self._run_front()
+                else:
+                    self._run_worker(slot)
+            except BaseException:
+                logger.exception("%s exited with an error.", "Front" if slot == FRONT else f"Worker {slot}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = slot
+        self.started[slot] = time.monotonic()
+
+    def stop(self, *_: Any) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload(self, snapshot: Any) -> None:
+        """Make a new knowledge base snapshot current here, then in the workers"""
+        from .actions import StudentHealthDatabase
+
+        StudentHealthDatabase.install(snapshot)
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        self.outdated = sorted(slot for slot in self.children.values() if slot != FRONT)
+
+    def listening(self, slot: int) -> bool:
+        try:
+            socket.create_connection(("127.0.0.1", self.worker_ports[slot]), timeout=POLL_INTERVAL).close()
+        except OSError:
+            return False
+        return True
+
+    def roll(self) -> None:
+        """Restart the next outdated worker once the previous one is serving"""
+        if self.replacing is not None:
+            slot, old_pid = self.replacing
+            if old_pid in self.children or slot not in self.children.values() or not self.listening(slot):
+                return
+            self.replacing = None
+        while self.outdated and not self.stopping:
+            slot = self.outdated.pop(0)
+            pid = next((pid for pid, running in self.children.items() if running == slot), None)
+            if pid is None:
+                # Down already; it is restarted from the new snapshot anyway.
+                continue
+            logger.info("Restarting worker %s (pid %s) on the new knowledge base.", slot, pid)
+            self.replacing = (slot, pid)
+            os.kill(pid, signal.SIGTERM)
+            return
+
+    def run(self) -> None:
+        from .actions import StudentHealthDatabase
+        from .knowledge import KnowledgeBaseWatcher
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for slot in range(len(self.worker_ports)):
+            self.spawn(slot)
+        self.spawn(FRONT)
+
+        # Polled from this loop rather than started: the supervisor keeps
+        # forking, so it must not run threads.
+        watcher = None
+        if self.reload_interval > 0:
+            watcher = KnowledgeBaseWatcher(StudentHealthDatabase.SNAPSHOT, self.reload,
+                                           interval=self.reload_interval)
+        next_check = time.monotonic() + self.reload_interval
+
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                if watcher is not None and not self.stopping and time.monotonic() >= next_check:
+                    watcher.check()
+                    next_check = time.monotonic() + self.reload_interval
+                self.roll()
+                time.sleep(POLL_INTERVAL)
+                continue
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+
+            name = "Front" if slot == FRONT else f"Worker {slot}"
+            if self.replacing == (slot, pid):
+                self.backoff[slot] = 0
+            else:
+                if time.monotonic() - self.started[slot] < MIN_UPTIME:
+                    self.backoff[slot] = min(MAX_BACKOFF, max(MIN_UPTIME, 2 * self.backoff.get(slot, 0)))
+                else:
+                    self.backoff[slot] = 0
+                logger.warning("%s (pid %s) exited with status %s; restarting in %.0fs.",
+                               name, pid, os.waitstatus_to_exitcode(status), self.backoff[slot])
+                time.sleep(self.backoff[slot])
+            if not self.stopping:
+                self.spawn(slot)
+
+
+def main(argv: Optional[List[Text]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the action server as supervised worker processes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1", help="Interface of the front endpoint.")
+    parser.add_argument("-p", "--port", type=int, default=5055, help="Port of the front endpoint.")
+    parser.add_argument("--worker-port", type=int, default=5100, help="Port of the first worker.")
+    parser.add_argument("--spill-after", type=int, default=8,
+                        help="In-flight calls on a conversation's worker before it is bypassed.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s - %(message)s")
+
+    # Each worker serves metrics on a port and a file of its own derived from
+    # these; the parent starts no threads or servers before forking.
+    metrics_port = os.environ.pop("HEALTH_METRICS_PORT", None)
+    metrics_dump = os.environ.pop("HEALTH_METRICS_DUMP", None)
+
+    from rasa_sdk.executor import ActionExecutor
+
+    from .knowledge import RELOAD_INTERVAL
+
+    executor = ActionExecutor()
+    executor.register_package("actions")
+
+    # Keep the collector from touching (and so copying) the shared pages.
+    gc.collect()
+    gc.freeze()
+
+    Supervisor(
+        executor,
+        workers=args.workers,
+        host=args.host,
+        port=args.port,
+        worker_port=args.worker_port,
+        spill_after=args.spill_after,
+        reload_interval=RELOAD_INTERVAL,
+        metrics_port=int(metrics_port) if metrics_port else None,
+        metrics_dump=metrics_dump,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
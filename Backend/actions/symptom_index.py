@@ -0,0 +1,173 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Text, Tuple
+
+from .fuzzy import FuzzyVocabulary
+
+
+class SymptomIndex:
+    """Inverted n-gram index from symptom text to the ailments listing it
+
+    A user symptom matches a knowledge base symptom when the KB symptom
+    occurs in the user text, or when the user text occurs in the KB symptom
+    starting at a word boundary (so "head" finds "headache" but "ache" does
+    not match every "...ache"). Instead of testing every pair, the index
+    keeps character n-gram postings for the second case and anchor n-grams
+    for the first, and every candidate is verified with a real substring
+    test. User text that matches nothing exactly is spell-corrected word by
+    word against the KB vocabulary and looked up again, which catches typos
+    such as "headake" or "stomache ache". Everyday wordings from the KB
+    ``symptom_synonyms`` are indexed as symptoms of their own, posted to the
+    ailments listing the symptom they stand for.
+    """
+
+    NGRAM = 3
+    MAX_UNVERIFIED = 8
+
+    def __init__(self, ailments: Sequence[Text], symptom_counts: Sequence[int],
+                 symptoms: Sequence[Text], symptom_ailments: Sequence[Sequence[int]],
+                 vocabulary: Optional[FuzzyVocabulary] = None):
+        self.ailments = ailments
+        self.symptom_counts = symptom_counts
+        self.symptoms = symptoms
+        self.symptom_ailments = symptom_ailments
+        self.vocabulary = vocabulary or FuzzyVocabulary(symptoms)
+
+        self._grams: Dict[Text, Set[int]] = {}
+        self._anchors: Dict[Text, List[int]] = {}
+        self._short: Dict[Text, Set[int]] = {}
+        self._short_symptoms: List[int] = []
+
+        n = self.NGRAM
+        for symptom_id, symptom in enumerate(symptoms):
+            for i in range(len(symptom) - n + 1):
+                self._grams.setdefault(symptom[i:i + n], set()).add(symptom_id)
+            for length in range(n):
+                for i in range(len(symptom) - length + 1):
+                    self._short.setdefault(symptom[i:i + length], set()).add(symptom_id)
+            if len(symptom) < n:
+                self._short_symptoms.append(symptom_id)
+            else:
+                self._anchors.setdefault(symptom[:n], []).append(symptom_id)
+        # Shortest first, so a scan stops at the first symptom too long to fit.
+        for anchored in self._anchors.values():
+            anchored.sort(key=lambda symptom_id: len(symptoms[symptom_id]))
+        self._word_starts = [" " + symptom for symptom in symptoms]
+
+    @staticmethod
+    def postings(ailments: Dict[Text, Dict[Text, Any]],
+                 synonyms: Optional[Dict[Text, Sequence[Text]]] = None
+                 ) -> Tuple[List[int], List[Text], List[Tuple[int, ...]]]:
+        """Derive symptom counts, distinct symptoms and symptom -> ailment ids
+
+        Each synonym variant shares the ailment ids of its symptom. Variants
+        of symptoms no ailment lists (emergency symptoms) are skipped.
+        """
+        symptom_counts = []
+        owners: Dict[Text, List[int]] = {}
+        for ailment_id, data in enumerate(ailments.values()):
+            ailment_symptoms = [s.lower() for s in data["symptoms"]]
+            symptom_counts.append(len(ailment_symptoms))
+            for symptom in ailment_symptoms:
+                ids = owners.setdefault(symptom, [])
+                if not ids or ids[-1] != ailment_id:
+                    ids.append(ailment_id)
+        for symptom, variants in (synonyms or {}).items():
+            ids = owners.get(" ".join(symptom.lower().split()))
+            if not ids:
+                continue
+            for variant in variants:
+                owners.setdefault(" ".join(variant.lower().split()), ids)
+        return symptom_counts, list(owners), [tuple(ids) for ids in owners.values()]
+
+    @classmethod
+    def from_ailments(cls, ailments: Dict[Text, Dict[Text, Any]],
+                      synonyms: Optional[Dict[Text, Sequence[Text]]] = None) -> "SymptomIndex":
+        return cls(list(ailments), *cls.postings(ailments, synonyms))
+
+    def matching_symptoms(self, text: Text) -> Set[int]:
+        """Ids of KB symptoms matching the (lowercased) user text"""
+        matches = self._exact_matches(text)
+        if not matches:
+            corrected = self.vocabulary.correct_text(text)
+            if corrected != text:
+                matches = self._exact_matches(corrected)
+        return matches
+
+    def _exact_matches(self, text: Text) -> Set[int]:
+        n = self.NGRAM
+        matches: Set[int] = set()
+        if not text.strip():
+            return matches
+
+        # Text inside a KB symptom: every n-gram of the text must be posted.
+        # Intersecting the rarest postings is enough to narrow the candidates
+        # down, since each one is verified below anyway.
+        candidates = None
+        if len(text) < n:
+            candidates = self._short.get(text)
+        else:
+            postings = []
+            for i in range(len(text) - n + 1):
+                posting = self._grams.get(text[i:i + n])
+                if not posting:
+                    break
+                postings.append(posting)
+            else:
+                postings.sort(key=len)
+                candidates = postings[0]
+                for posting in postings[1:]:
+                    if len(candidates) <= self.MAX_UNVERIFIED:
+                        break
+                    candidates = candidates & posting
+        if candidates:
+            word_start = " " + text
+            matches.update(s for s in candidates if word_start in self._word_starts[s])
+
+        # KB symptom inside the text: look up the n-gram starting at each offset.
+        for i in range(len(text) - n + 1):
+            room = len(text) - i
+            for symptom_id in self._anchors.get(text[i:i + n], ()):
+                symptom = self.symptoms[symptom_id]
+                if len(symptom) > room:
+                    break
+                if text.startswith(symptom, i):
+                    matches.add(symptom_id)
+        for symptom_id in self._short_symptoms:
+            if self.symptoms[symptom_id] in text:
+                matches.add(symptom_id)
+
+        return matches
+
+    def score(self, symptoms: Iterable[Text]) -> Dict[int, int]:
+        """Count, per ailment id, the user symptoms matching any of its symptoms"""
+        return self.score_matches(self.matching_symptoms(text.lower()) for text in symptoms)
+
+    def score_matches(self, matches: Iterable[Set[int]]) -> Dict[int, int]:
+        """``score`` for the KB symptom ids each user symptom matched"""
+        scores: Dict[int, int] = {}
+        for symptom_ids in matches:
+            hit: Set[int] = set()
+            for symptom_id in symptom_ids:
+                hit.update(self.symptom_ailments[symptom_id])
+            for ailment_id in hit:
+                scores[ailment_id] = scores.get(ailment_id, 0) + 1
+        return scores
+
+    def rank(self, symptoms: Iterable[Text],
+             fit: Optional[Sequence[float]] = None) -> List[Tuple[Text, int, float]]:
+        """Return (ailment, score, match_percentage) ordered best first
+
+        Equal scores are ordered by the optional per-ailment profile ``fit``
+        (see :class:`AilmentProfiles`), then by match percentage.
+        """
+        return self.rank_scores(self.score(symptoms), fit)
+
+    def rank_scores(self, scores: Dict[int, int],
+                    fit: Optional[Sequence[float]] = None) -> List[Tuple[Text, int, float]]:
+        """``rank`` for scores computed already"""
+        ranked = []
+        for ailment_id, match_score in scores.items():
+            match_percentage = (match_score / self.symptom_counts[ailment_id]) * 100
+            profile = -fit[ailment_id] if fit is not None else 0
+            ranked.append((-match_score, profile, -match_percentage, ailment_id))
+        ranked.sort()
+        return [(self.ailments[a], -s, -p) for s, _, p, a in ranked]
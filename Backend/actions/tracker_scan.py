@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from rasa_sdk import Tracker
+
+from .emergency import EmergencyDetector
+
+
+class ConversationScan:
+    """What has been learned so far from one conversation's event history"""
+
+    __slots__ = ("event_count", "fingerprint", "emergency_keyword")
+
+    def __init__(self):
+        self.event_count = 0
+        self.fingerprint: Optional[Tuple[Any, Any]] = None
+        self.emergency_keyword = False
+
+
+class TrackerScanCache:
+    """Incremental, LRU-bounded scanning of tracker events per sender
+
+    The action server receives the full event history on every call. This
+    cache remembers how many events of each conversation were already
+    scanned, so a turn only looks at the events appended since the last one.
+    If the history no longer lines up with what was scanned (for example it
+    was shortened or rewritten), the conversation is rescanned from scratch.
+    """
+
+    def __init__(self, detector: EmergencyDetector, max_conversations: int = 10000):
+        self.detector = detector
+        self.max_conversations = max_conversations
+        self._scans: "OrderedDict[Text, ConversationScan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reset(self, detector: EmergencyDetector) -> None:
+        """Switch to a new detector and forget scans made with the old one"""
+        with self._lock:
+            self.detector = detector
+            self._scans = OrderedDict()
+
+    @staticmethod
+    def _fingerprint(event: Dict[Text, Any]) -> Tuple[Any, Any]:
+        return event.get("event"), event.get("timestamp")
+
+    @classmethod
+    def _continues(cls, summary: Optional[ConversationScan], events: List[Dict[Text, Any]]) -> bool:
+        # Whether the events extend the history the summary was built from.
+        return summary is not None and summary.event_count <= len(events) and (
+            not summary.event_count
+            or cls._fingerprint(events[summary.event_count - 1]) == summary.fingerprint
+        )
+
+    def pending(self, tracker: Tracker) -> int:
+        """How many events the next ``scan`` of this tracker has to look at"""
+        events = tracker.events
+        with self._lock:
+            summary = self._scans.get(tracker.sender_id)
+        if not self._continues(summary, events):
+            return len(events)
+        return len(events) - summary.event_count
+
+    def scan(self, tracker: Tracker) -> ConversationScan:
+        """Bring the sender's scan up to date with the tracker and return it"""
+        events = tracker.events
+        with self._lock:
+            summary = self._scans.pop(tracker.sender_id, None)
+            detector = self.detector
+
+        if not self._continues(summary, events):
+            summary = ConversationScan()
+
+        for event in events[summary.event_count:]:
+            if summary.emergency_keyword:
+                break
+            text = event.get("text")
+            if text and event.get("event") == "user" and detector.has_keyword(text):
+                summary.emergency_keyword = True
+
+        summary.event_count = len(events)
+        if events:
+            summary.fingerprint = self._fingerprint(events[-1])
+
+        with self._lock:
+            if detector is not self.detector:
+                return summary
+            self._scans[tracker.sender_id] = summary
+            while len(self._scans) > self.max_conversations:
+                self._scans.popitem(last=False)
+        return summary
@@ -0,0 +1,155 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Text
+
+from rasa.core.actions.action import create_bot_utterance
+from rasa.core.channels.channel import CollectingOutputChannel, OutputChannel, UserMessage
+from rasa.core.channels.rest import QueueOutputChannel, RestInput
+from rasa.shared.core.events import BotUttered, SlotSet, UserUttered
+from rasa.shared.core.trackers import DialogueStateTracker
+from sanic import Blueprint
+from sanic.request import Request
+from sanic.response import HTTPResponse, json
+
+from .domain_digest import register_from_env
+from .fast_path import EmergencyFastPath
+from .nlu_cache import DEFAULT_MAX_LENGTH, DEFAULT_SIZE, DEFAULT_TTL, ParseCache, install
+from .screening import emergency_detector
+
+logger = logging.getLogger(__name__)
+
+EMERGENCY_ALERT = "utter_emergency_alert"
+EMERGENCY_SLOT = "emergency_case"
+
+# Rasa imports the channel before it handles any message.
+register_from_env()
+
+
+class CachedRestInput(EmergencyFastPath, RestInput):
+    """The REST channel with a parse cache in front of the NLU pipeline
+
+    It is opt-in: put it in ``credentials.yml`` in place of ``rest``, the
+    default, and it keeps that channel's URL (``/webhooks/rest/webhook``)::
+
+        addons.channels.CachedRestInput:
+          cache_size: 10000       # parse results kept
+          cache_ttl: 3600         # seconds
+          cache_max_length: 64    # longer messages are not cached
+          emergency_fast_path: true
+
+    The cache is attached to the agent's processor on the first request
+    after a model is loaded. ``GET /webhooks/rest/nlu_cache`` reports its
+    size and hit rate.
+
+    With the emergency fast path (see :mod:`addons.fast_path`), a message
+    with one of the knowledge base's ``emergency_alert_phrases`` ("I can't
+    breathe", "heart attack") is sent ``utter_emergency_alert`` straight
+    away, before NLU and the policies run. Broad emergency keywords ("help
+    me", "broken") are left to ``action_check_emergency``. A plain request
+    is answered with the alert alone while the pipeline runs in the
+    background; its replies come ahead of the replies to the next message,
+    or from ``GET /webhooks/rest/pending/<sender_id>`` before that. A
+    streamed request (``?stream=true``) gets them on the same stream.
+    ``GET /webhooks/rest/emergency_fast_path`` reports how often it fired
+    and how long the alerts took.
+
+    With ``HEALTH_ACTION_DOMAIN_DIGEST=1`` it also registers
+    ``addons.domain_digest.DomainDigest``.
+    """
+
+    @classmethod
+    def name(cls) -> Text:
+        return "rest"
+
+    @classmethod
+    def from_credentials(cls, credentials: Optional[Dict[Text, Any]]) -> "CachedRestInput":
+        credentials = credentials or {}
+        return cls(
+            ParseCache(
+                maxsize=int(credentials.get("cache_size", DEFAULT_SIZE)),
+                ttl=float(credentials.get("cache_ttl", DEFAULT_TTL)),
+                max_length=int(credentials.get("cache_max_length", DEFAULT_MAX_LENGTH)),
+            ),
+            emergency_fast_path=bool(credentials.get("emergency_fast_path", True)),
+        )
+
+    def __init__(self, cache: Optional[ParseCache] = None, emergency_fast_path: bool = True):
+        self.cache = cache or ParseCache()
+        self.emergency_fast_path = emergency_fast_path
+        self.agent: Any = None
+        EmergencyFastPath.__init__(self)
+
+    def is_emergency(self, text: Optional[Text]) -> bool:
+        # "/intent" messages name their intent already.
+        return (
+            self.agent is not None and bool(text) and not text.startswith("/")
+            and emergency_detector().has_alert_phrase(text)
+        )
+
+    async def alert(self, sender_id: Text) -> Optional[Dict[Text, Any]]:
+        """``utter_emergency_alert`` rendered for the channel; None if the
+        model's domain has no such response"""
+        tracker = DialogueStateTracker(sender_id, self.agent.domain.slots)
+        message = await self.agent.processor.nlg.generate(EMERGENCY_ALERT, tracker, self.name())
+        if message:
+            message["utter_action"] = EMERGENCY_ALERT
+        return message
+
+    async def record_alert(self, sender_id: Text, alert: Dict[Text, Any]) -> None:
+        """Add the alert and ``emergency_case`` to the tracker unless the
+        pipeline sent the alert for the latest message itself"""
+        async with self.agent.lock_store.lock(sender_id):
+            tracker = await self.agent.processor.get_tracker(sender_id)
+            for event in reversed(tracker.events):
+                if isinstance(event, UserUttered):
+                    break
+                if isinstance(event, BotUttered) and event.text == alert.get("text"):
+                    return
+            tracker.update_with_events(
+                [SlotSet(EMERGENCY_SLOT, True), create_bot_utterance(dict(alert))], self.agent.domain
+            )
+            await self.agent.processor.save_tracker(tracker)
+
+    def relay(self, message: UserMessage, output_channel: OutputChannel) -> UserMessage:
+        return UserMessage(
+            message.text, output_channel, message.sender_id, input_channel=message.input_channel,
+            message_id=message.message_id, metadata=message.metadata,
+        )
+
+    def is_streaming(self, message: UserMessage) -> bool:
+        return isinstance(message.output_channel, QueueOutputChannel)
+
+    def blueprint(self, on_new_message: Callable[[UserMessage], Awaitable[Any]]) -> Blueprint:
+        if self.emergency_fast_path:
+            emergency_detector()
+            on_new_message = self.fast_path(on_new_message)
+        webhook = super().blueprint(on_new_message)
+
+        @webhook.middleware("request")
+        async def attach_cache(request: Request) -> None:
+            # A no-op unless the agent has loaded a new model since.
+            agent = getattr(request.app.ctx, "agent", None)
+            if agent is not None and getattr(agent, "processor", None) is not None:
+                self.agent = agent
+                install(agent.processor, self.cache)
+
+        @webhook.route("/nlu_cache", methods=["GET"])
+        async def cache_stats(request: Request) -> HTTPResponse:
+            return json(self.cache.stats())
+
+        @webhook.route("/emergency_fast_path", methods=["GET"])
+        async def fast_path_stats(request: Request) -> HTTPResponse:
+            return json({
+                "enabled": self.emergency_fast_path,
+                "alerts": self.alerts,
+                "mean_alert_ms": round(1000 * self.alert_seconds / self.alerts, 3) if self.alerts else 0.0,
+                "in_background": self.in_background,
+            })
+
+        @webhook.route("/pending/<sender_id>", methods=["GET"])
+        async def pending_replies(request: Request, sender_id: Text) -> HTTPResponse:
+            collector = CollectingOutputChannel()
+            for reply in self.take_pending(sender_id):
+                await collector.send_response(sender_id, reply)
+            return json(collector.messages)
+
+        return webhook
@@ -0,0 +1,90 @@
+"""Send the domain to the action server once per model instead of per call.
+
+Rasa Open Source puts the whole domain into every action call, and the
+action server decodes it again on every call. The SDK action server can
+keep the domain itself: a call carrying a ``domain_digest`` it has seen
+reuses the stored domain, and one it has not seen is answered with 449.
+
+``DomainDigest`` is a Rasa plugin that adds the digest (a hash of the
+domain's content) to every call and leaves the domain out once it has been
+sent with that digest. A new model has a new digest, so its domain is sent
+once again. Enable it on the Rasa server with::
+
+    HEALTH_ACTION_DOMAIN_DIGEST=1 rasa run ...
+
+It needs ``addons.channels.CachedRestInput`` in ``credentials.yml``, which
+registers it, and the action server run by ``python -m actions.supervisor``:
+Rasa Open Source fails an action on a 449 instead of retrying it with the
+domain, and the supervisor's front keeps every domain it has forwarded so
+that it can answer a worker's 449 itself, also after restarts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Set, Text
+
+import pluggy
+
+logger = logging.getLogger(__name__)
+
+ENV_ENABLED = "HEALTH_ACTION_DOMAIN_DIGEST"
+
+hookimpl = pluggy.HookimplMarker("rasa")
+
+
+def digest(domain: Dict[Text, Any]) -> Text:
+    """Hash of a domain's content"""
+    encoded = json.dumps(domain, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+
+class DomainDigest:
+    """Replaces the domain of each action call with its digest once it was sent"""
+
+    def __init__(self) -> None:
+        self.sent: Set[Text] = set()
+        # ``Domain.as_dict()`` returns the same dict on every call, so it is
+        # hashed once per model. Holding on to it keeps its id from being reused.
+        self._domain: Optional[Dict[Text, Any]] = None
+        self._digest: Optional[Text] = None
+
+    def digest_of(self, domain: Dict[Text, Any]) -> Text:
+        if domain is not self._domain:
+            self._domain, self._digest = domain, digest(domain)
+        return self._digest  # type: ignore[return-value]
+
+    @hookimpl
+    def prefix_stripping_for_custom_actions(self, json_body: Dict[Text, Any]) -> Optional[Dict[Text, Any]]:
+        domain = json_body.get("domain")
+        if not isinstance(domain, dict) or "domain_digest" in json_body:
+            return None
+        domain_digest = self.digest_of(domain)
+        body = dict(json_body, domain_digest=domain_digest)
+        if domain_digest in self.sent:
+            del body["domain"]
+        else:
+            self.sent.add(domain_digest)
+            logger.info("Sending domain %s to the action server.", domain_digest)
+        return body
+
+
+_registered: Optional[DomainDigest] = None
+
+
+def register() -> DomainDigest:
+    """Register the plugin with Rasa, once per process"""
+    global _registered
+    if _registered is None:
+        from rasa.plugin import plugin_manager
+
+        _registered = DomainDigest()
+        plugin_manager().register(_registered)
+    return _registered
+
+
+def register_from_env() -> Optional[DomainDigest]:
+    if os.environ.get(ENV_ENABLED, "").lower() in ("1", "true", "yes"):
+        return register()
+    return None
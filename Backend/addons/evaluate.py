@@ -0,0 +1,389 @@
+"""Parallel regression evaluation of the test stories and the knowledge base.
+
+Two kinds of cases are checked, from the ``Backend`` directory::
+
+    python -m addons.evaluate                  # everything
+    python -m addons.evaluate --changed-only   # only what an edit can affect
+
+* Test stories (``tests/test_stories.yml``) are run against the trained
+  model the way ``rasa test core`` runs them: every action in a story must
+  be the one the policies predict, and with ``--e2e`` every user message
+  must also be parsed to its intent.
+* KB cases (``tests/kb_cases.yml``) give symptoms, and optionally a
+  duration and a severity, together with the ailment ``rank_ailments``
+  should put first (or within ``top_k``) and whether ``check_emergency``
+  should flag them.
+
+Cases are split into chunks over ``--workers`` processes. Each worker loads
+the model once and keeps it for every chunk it is given; stories are
+handed out longest first so that no worker is left with a long story at the
+end. Results are merged into one report, ``results/evaluation.json``, and
+the command fails if any case fails.
+
+Every result is stored with a fingerprint of what it depends on:
+
+* a story, on its steps and the model file;
+* a KB case, on the case, the ``actions`` code, the emergency phrases, the
+  KB symptoms its symptoms match and the record of every ailment having
+  one of them (or expected by the case).
+
+With ``--changed-only``, cases whose fingerprint is unchanged since the
+previous report keep their result, so editing one ailment re-runs only the
+KB cases involving it and editing one story re-runs only that story.
+Stories joined by checkpoints are evaluated, and fingerprinted, together.
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Text, Tuple
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORIES = os.path.join("tests", "test_stories.yml")
+DEFAULT_KB_CASES = os.path.join("tests", "kb_cases.yml")
+DEFAULT_REPORT = os.path.join("results", "evaluation.json")
+
+# Set in each worker process by ``_init_worker``.
+_AGENT: Any = None
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_E2E = False
+
+
+def _hash(*parts: Any) -> Text:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8") + b"\0")
+    return digest.hexdigest()[:32]
+
+
+def _file_hash(path: Text) -> Text:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def _load_yaml(path: Text) -> Dict[Text, Any]:
+    from ruamel.yaml import YAML
+
+    with open(path, encoding="utf-8") as f:
+        return YAML(typ="safe").load(f) or {}
+
+
+def latest_model(models: Text = "models") -> Optional[Text]:
+    paths = glob.glob(os.path.join(models, "*.tar.gz"))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+# Stories
+
+
+def read_stories(path: Text) -> List[Dict[Text, Any]]:
+    """Stories with a unique ``id``; a repeated name gets ``#2``, ``#3``, ..."""
+    stories = _load_yaml(path).get("stories") or []
+    seen: Dict[Text, int] = {}
+    for story in stories:
+        name = story["story"]
+        seen[name] = seen.get(name, 0) + 1
+        story["id"] = name if seen[name] == 1 else f"{name}#{seen[name]}"
+    return stories
+
+
+def story_units(stories: List[Dict[Text, Any]]) -> List[List[Dict[Text, Any]]]:
+    """Stories grouped into independently runnable units
+
+    A story stands alone unless it uses checkpoints; all stories with
+    checkpoints form one unit, as any of them may continue another.
+    """
+    linked = [s for s in stories if any("checkpoint" in step for step in s.get("steps") or ())]
+    units = [[s] for s in stories if not any(s is l for l in linked)]
+    if linked:
+        units.append(linked)
+    return units
+
+
+def _story_size(unit: List[Dict[Text, Any]]) -> int:
+    return sum(len(story.get("steps") or ()) for story in unit)
+
+
+def evaluate_stories(units: List[List[Dict[Text, Any]]]) -> List[Dict[Text, Any]]:
+    """Run one chunk of story units through this worker's model"""
+    from ruamel.yaml import YAML
+
+    stories = [
+        {"story": story["id"], "steps": story.get("steps") or []}
+        for unit in units for story in unit
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stories.yml")
+        with open(path, "w", encoding="utf-8") as f:
+            YAML(typ="safe", pure=True).dump({"version": "3.1", "stories": stories}, f)
+        failures = _LOOP.run_until_complete(_predict_stories(path))
+
+    results = []
+    for story in stories:
+        found = failures.get(story["story"])
+        result = {"id": story["story"], "passed": found == [], "failures": found or []}
+        if found is None:
+            result["failures"] = ["No conversation was generated from this story."]
+        results.append(result)
+    return results
+
+
+async def _predict_stories(path: Text) -> Dict[Text, List[Text]]:
+    """Story id -> wrong predictions, for every story in the file"""
+    from rasa.core.test import (
+        WronglyClassifiedUserUtterance,
+        WronglyPredictedAction,
+        _create_data_generator,
+        _predict_tracker_actions,
+    )
+
+    failures: Dict[Text, List[Text]] = {}
+    trackers = _create_data_generator(path, _AGENT).generate_story_trackers()
+    for tracker in trackers:
+        store, predicted, _, _ = await _predict_tracker_actions(tracker, _AGENT, use_e2e=_E2E)
+        wrong: List[Text] = []
+        if store.check_prediction_target_mismatch():
+            for event in predicted.events:
+                if isinstance(event, WronglyPredictedAction):
+                    wrong.append(f"expected action {event.action_name}, predicted {event.action_name_prediction}")
+                elif isinstance(event, WronglyClassifiedUserUtterance):
+                    wrong.append(
+                        f"expected intent {event.intent.get('name')} for '{event.text}', "
+                        f"predicted {event.predicted_intent}"
+                    )
+            wrong = wrong or ["The predictions do not match the story."]
+        # A conversation through checkpoints is named "first > second > ...".
+        for story_id in tracker.sender_id.split(" > "):
+            failures.setdefault(story_id, []).extend(wrong)
+    return failures
+
+
+# KB cases
+
+
+def read_kb_cases(path: Text) -> List[Dict[Text, Any]]:
+    cases = _load_yaml(path).get("cases") or []
+    ids: Set[Text] = set()
+    for case in cases:
+        case_id = case.get("id")
+        if not case_id or case_id in ids:
+            raise ValueError(f"{path}: every case needs a unique id, got {case_id!r}")
+        if "expect" not in case and "emergency" not in case:
+            raise ValueError(f"{path}: case {case_id} expects neither an ailment nor an emergency")
+        ids.add(case_id)
+    return cases
+
+
+def kb_fingerprints(cases: List[Dict[Text, Any]]) -> Dict[Text, Text]:
+    """Case id -> hash of the case and of the KB content it depends on"""
+    if not cases:
+        return {}
+    from actions.actions import StudentHealthDatabase
+    from actions.kb import read_source
+
+    data = read_source()
+    records = {name: _hash(record) for name, record in data["ailments"].items()}
+    code = {
+        os.path.basename(path): _file_hash(path)
+        for path in sorted(glob.glob(os.path.join(BACKEND_DIR, "actions", "*.py")))
+    }
+    engine = _hash(code, data.get("emergency_symptoms"), data.get("emergency_keywords"))
+
+    index = StudentHealthDatabase.SNAPSHOT.symptom_index
+    fingerprints = {}
+    for case in cases:
+        matched = [index.matching_symptoms(str(text).lower()) for text in case.get("symptoms") or ()]
+        ailments = {case.get("expect")}
+        for symptom_id in set().union(*matched):
+            ailments.update(index.ailments[a] for a in index.symptom_ailments[symptom_id])
+        matched = [sorted(index.symptoms[s] for s in ids) for ids in matched]
+        dependencies = sorted((name, records.get(name)) for name in ailments if name)
+        fingerprints[case["id"]] = _hash(case, engine, matched, dependencies)
+    return fingerprints
+
+
+def evaluate_kb_cases(cases: List[Dict[Text, Any]]) -> List[Dict[Text, Any]]:
+    """Check one chunk of KB cases against the knowledge base"""
+    from actions.actions import StudentHealthDatabase
+
+    kb = StudentHealthDatabase.SNAPSHOT
+    results = []
+    for case in cases:
+        symptoms = case.get("symptoms") or []
+        top_k = int(case.get("top_k", 1))
+        candidates = StudentHealthDatabase.rank_ailments(
+            symptoms, case.get("duration"), case.get("severity"), max(top_k, 3), kb
+        )
+        ranked = [ailment for ailment, _, _ in candidates]
+        emergency = StudentHealthDatabase.check_emergency(symptoms, kb)
+        failures = []
+        if "expect" in case and case["expect"] not in ranked[:top_k]:
+            failures.append(f"expected {case['expect']} in the top {top_k}, ranked {ranked}")
+        if "emergency" in case and emergency != bool(case["emergency"]):
+            failures.append(f"expected emergency {bool(case['emergency'])}, got {emergency}")
+        results.append({
+            "id": case["id"],
+            "passed": not failures,
+            "failures": failures,
+            "ranked": ranked,
+            "emergency": emergency,
+        })
+    return results
+
+
+# Running
+
+
+def _init_worker(model: Optional[Text], e2e: bool) -> None:
+    global _AGENT, _LOOP, _E2E
+
+    if model is None:
+        return
+    from rasa.core.agent import Agent
+
+    _LOOP = asyncio.new_event_loop()
+    asyncio.set_event_loop(_LOOP)
+    _AGENT = Agent.load(model)
+    _E2E = e2e
+
+
+def run(jobs: Iterator[Tuple[Text, Callable[[List[Any]], List[Dict[Text, Any]]], List[Any]]],
+        workers: int, model: Optional[Text], e2e: bool) -> Iterator[Tuple[Text, Dict[Text, Any]]]:
+    """Run (kind, function, chunk) jobs over the pool; yield (kind, result) as chunks complete
+
+    At most two chunks per worker are in flight, as in ``actions.batch``.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model, e2e)) as pool:
+        pending: Dict[Future, Text] = {}
+        while True:
+            for kind, function, chunk in itertools.islice(jobs, 2 * workers - len(pending)):
+                pending[pool.submit(function, chunk)] = kind
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind = pending.pop(future)
+                for result in future.result():
+                    yield kind, result
+
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _previous(path: Text) -> Dict[Text, Dict[Text, Dict[Text, Any]]]:
+    """kind -> case id -> result, from an earlier report"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {kind: {r["id"]: r for r in report.get(kind, ())} for kind in ("stories", "kb_cases")}
+
+
+def main(argv: Optional[List[Text]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate the test stories and KB cases in parallel.")
+    parser.add_argument("-m", "--model", default=None, help="Model to test; the newest in models/ by default.")
+    parser.add_argument("--stories", default=DEFAULT_STORIES)
+    parser.add_argument("--kb-cases", default=DEFAULT_KB_CASES)
+    parser.add_argument("--no-stories", action="store_true", help="Only check the KB cases.")
+    parser.add_argument("--e2e", action="store_true", help="Also check the intent of every user message.")
+    parser.add_argument("-o", "--report", default=DEFAULT_REPORT)
+    parser.add_argument("--changed-only", action="store_true",
+                        help="Keep the previous report's result for cases whose fingerprint is unchanged.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=20, help="Stories per chunk; KB cases go 25 times as many.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s - %(message)s")
+
+    # One knowledge base version for the whole run.
+    os.environ.setdefault("HEALTH_KB_RELOAD_INTERVAL", "0")
+    started = time.monotonic()
+    previous = _previous(args.report) if args.changed_only else {}
+
+    units: List[List[Dict[Text, Any]]] = []
+    model = None
+    if not args.no_stories and os.path.isfile(args.stories):
+        units = story_units(read_stories(args.stories))
+    if units:
+        model = args.model or latest_model()
+        if model is None:
+            parser.error("no model to test the stories with; train one or pass --no-stories")
+    cases = read_kb_cases(args.kb_cases) if os.path.isfile(args.kb_cases) else []
+
+    fingerprints: Dict[Text, Dict[Text, Text]] = {"stories": {}, "kb_cases": kb_fingerprints(cases)}
+    if units:
+        model_hash = _file_hash(model)
+        for unit in units:
+            unit_hash = _hash([s.get("steps") for s in unit], model_hash)
+            fingerprints["stories"].update((story["id"], unit_hash) for story in unit)
+
+    results: Dict[Text, Dict[Text, Dict[Text, Any]]] = {"stories": {}, "kb_cases": {}}
+    reused = 0
+    for kind, ids in fingerprints.items():
+        for case_id, fingerprint in ids.items():
+            result = previous.get(kind, {}).get(case_id)
+            if result and result.get("fingerprint") == fingerprint:
+                results[kind][case_id] = result
+                reused += 1
+    units = [u for u in units if any(s["id"] not in results["stories"] for s in u)]
+    units.sort(key=_story_size, reverse=True)
+    cases = [c for c in cases if c["id"] not in results["kb_cases"]]
+
+    jobs = itertools.chain(
+        (("stories", evaluate_stories, chunk) for chunk in _chunks(units, args.chunk_size)),
+        (("kb_cases", evaluate_kb_cases, chunk) for chunk in _chunks(cases, 25 * args.chunk_size)),
+    )
+    if units or cases:
+        workers = args.workers or os.cpu_count() or 1
+        logger.info("Evaluating %s stories and %s KB cases on %s workers; %s results reused.",
+                    sum(len(u) for u in units), len(cases), workers, reused)
+        for kind, result in run(jobs, workers, model if units else None, args.e2e):
+            result["fingerprint"] = fingerprints[kind][result["id"]]
+            results[kind][result["id"]] = result
+
+    summary: Dict[Text, Any] = {}
+    for kind, ids in fingerprints.items():
+        ordered = [results[kind][case_id] for case_id in ids]
+        failed = [r["id"] for r in ordered if not r["passed"]]
+        summary[kind] = {"total": len(ordered), "passed": len(ordered) - len(failed), "failed": failed}
+    summary["reused"] = reused
+    summary["seconds"] = round(time.monotonic() - started, 2)
+
+    report = {
+        "model": model,
+        "summary": summary,
+        **{kind: [results[kind][case_id] for case_id in ids] for kind, ids in fingerprints.items()},
+    }
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(f"{args.report}.tmp", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    os.replace(f"{args.report}.tmp", args.report)
+
+    print(json.dumps(summary, indent=2))
+    for kind, ids in fingerprints.items():
+        for case_id in summary[kind]["failed"]:
+            for failure in results[kind][case_id]["failures"]:
+                print(f"FAILED {kind} {case_id}: {failure}", file=sys.stderr)
+    if any(summary[kind]["failed"] for kind in fingerprints):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
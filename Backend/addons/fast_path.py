@@ -0,0 +1,147 @@
+"""Emergency alerts sent before the NLU pipeline runs.
+
+``EmergencyFastPath`` wraps a channel's ``on_new_message``. A message with
+one of the knowledge base's ``emergency_alert_phrases`` is sent
+``utter_emergency_alert`` at once, and the full pipeline then runs for it:
+
+* on a streamed request the pipeline runs while the stream is open, so its
+  replies follow the alert on the same stream;
+* on a plain request the response goes back with the alert alone and the
+  pipeline runs in a background task. Its replies are kept per conversation
+  and sent ahead of the replies to the user's next message, or can be
+  fetched earlier with ``take_pending``.
+
+Either way the pipeline's own copy of the alert is left out, and the alert
+and ``emergency_case`` are recorded on the tracker afterwards.
+
+The module does not import Rasa: the channel provides the hooks that do
+(``is_emergency``, ``alert``, ``record_alert``, ``relay``, ``is_streaming``).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Text
+
+logger = logging.getLogger(__name__)
+
+
+class AlertedOutputChannel:
+    """Sends the pipeline's replies to a channel that has had the emergency
+    alert already, leaving out the pipeline's own copy of it"""
+
+    def __init__(self, output_channel: Any, alert: Dict[Text, Any]):
+        self.output_channel = output_channel
+        self.alert = alert
+        self.alert_repeated = False
+
+    def name(self) -> Text:
+        # Responses are rendered for the channel the user is on.
+        return self.output_channel.name()
+
+    async def send_response(self, recipient_id: Text, message: Dict[Text, Any]) -> None:
+        if not self.alert_repeated and message.get("text") == self.alert.get("text"):
+            self.alert_repeated = True
+            return
+        await self.output_channel.send_response(recipient_id, message)
+
+
+class PendingReplies:
+    """Output channel keeping the replies to a request that was answered already"""
+
+    def __init__(self, channel_name: Text, messages: List[Dict[Text, Any]]):
+        self.channel_name = channel_name
+        self.messages = messages
+
+    def name(self) -> Text:
+        return self.channel_name
+
+    async def send_response(self, recipient_id: Text, message: Dict[Text, Any]) -> None:
+        self.messages.append(message)
+
+
+class EmergencyFastPath:
+    """Mixin for input channels answering emergency messages ahead of the pipeline"""
+
+    def __init__(self):
+        self.alerts = 0
+        self.alert_seconds = 0.0
+        self.pending: Dict[Text, List[Dict[Text, Any]]] = {}
+        self._pipelines: Dict[Text, "asyncio.Future[Any]"] = {}
+
+    def is_emergency(self, text: Optional[Text]) -> bool:
+        raise NotImplementedError
+
+    async def alert(self, sender_id: Text) -> Optional[Dict[Text, Any]]:
+        """The rendered alert; None if it cannot be sent ahead of the pipeline"""
+        raise NotImplementedError
+
+    async def record_alert(self, sender_id: Text, alert: Dict[Text, Any]) -> None:
+        raise NotImplementedError
+
+    def relay(self, message: Any, output_channel: Any) -> Any:
+        """The message with its replies going to another output channel"""
+        raise NotImplementedError
+
+    def is_streaming(self, message: Any) -> bool:
+        raise NotImplementedError
+
+    @property
+    def in_background(self) -> int:
+        return len(self._pipelines)
+
+    def take_pending(self, sender_id: Text) -> List[Dict[Text, Any]]:
+        """Background replies for the conversation produced so far, once"""
+        return self.pending.pop(sender_id, [])
+
+    async def deliver_pending(self, message: Any) -> None:
+        """Send a conversation's background replies ahead of its next message"""
+        pipeline = self._pipelines.get(message.sender_id)
+        if pipeline is not None:
+            # The pipeline holds the conversation's lock anyway; waiting here
+            # keeps its replies in order. A cancelled request must not cancel it.
+            await asyncio.shield(pipeline)
+        for reply in self.take_pending(message.sender_id):
+            await message.output_channel.send_response(message.sender_id, reply)
+
+    async def run_pipeline(self, on_new_message: Callable[[Any], Awaitable[Any]], message: Any,
+                           output_channel: Any, alert: Dict[Text, Any]) -> Any:
+        try:
+            return await on_new_message(self.relay(message, AlertedOutputChannel(output_channel, alert)))
+        finally:
+            await self.record_alert(message.sender_id, alert)
+
+    async def _run_in_background(self, on_new_message: Callable[[Any], Awaitable[Any]], message: Any,
+                                 alert: Dict[Text, Any]) -> None:
+        replies = PendingReplies(message.output_channel.name(), self.pending.setdefault(message.sender_id, []))
+        try:
+            await self.run_pipeline(on_new_message, message, replies, alert)
+        except Exception:
+            logger.exception("Failed to process the emergency message of %s.", message.sender_id)
+
+    def fast_path(self, on_new_message: Callable[[Any], Awaitable[Any]]) -> Callable[[Any], Awaitable[Any]]:
+        """``on_new_message`` alerting on emergency messages before the pipeline"""
+        async def handle(message: Any) -> Any:
+            await self.deliver_pending(message)
+            if not self.is_emergency(message.text):
+                return await on_new_message(message)
+            started = time.perf_counter()
+            alert = await self.alert(message.sender_id)
+            if alert is None:
+                return await on_new_message(message)
+            await message.output_channel.send_response(message.sender_id, dict(alert))
+            self.alerts += 1
+            self.alert_seconds += time.perf_counter() - started
+            logger.info("Sent the emergency alert to %s ahead of the pipeline.", message.sender_id)
+
+            if self.is_streaming(message):
+                return await self.run_pipeline(on_new_message, message, message.output_channel, alert)
+            sender_id = message.sender_id
+            pipeline = asyncio.ensure_future(self._run_in_background(on_new_message, message, alert))
+            self._pipelines[sender_id] = pipeline
+            pipeline.add_done_callback(
+                lambda done: self._pipelines.pop(sender_id) if self._pipelines.get(sender_id) is done else None
+            )
+            return None
+
+        return handle
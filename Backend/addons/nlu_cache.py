@@ -0,0 +1,182 @@
+"""Cache of NLU parse results for repeated short messages.
+
+Greetings, "yes", "mild" and "thank you" make up a large share of the
+traffic, and each one otherwise runs the whole NLU pipeline. ``ParseCache``
+keeps recent parse results keyed by the normalized text (case-folded,
+whitespace collapsed) and the model that produced them. Entries expire
+after ``ttl`` seconds, and the least recently used entry is evicted beyond
+``maxsize``. Entity offsets are mapped back onto every message served
+from the cache, so "I have a  Headache" gets correct spans from a result
+computed for "i have a headache".
+"""
+
+import copy
+import logging
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Text, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZE = 10000
+DEFAULT_TTL = 3600.0
+# Long messages rarely repeat; caching them would only churn the cache.
+DEFAULT_MAX_LENGTH = 64
+
+
+def normalize(text: Text) -> Tuple[Text, List[int]]:
+    """Case-folded, whitespace-collapsed text and, for each of its
+    characters, the offset of the character it came from"""
+    chars: List[Text] = []
+    origins: List[int] = []
+    space = False
+    for i, char in enumerate(text):
+        if char.isspace():
+            space = bool(chars)
+            continue
+        if space:
+            chars.append(" ")
+            origins.append(i - 1)
+            space = False
+        for folded in char.lower():
+            chars.append(folded)
+            origins.append(i)
+    return "".join(chars), origins
+
+
+def _to_key(offset: int, origins: List[int]) -> int:
+    # First normalized character at or after an offset of the message.
+    return bisect_left(origins, offset)
+
+
+def _to_text(index: int, origins: List[int], text: Text) -> int:
+    return origins[index] if index < len(origins) else len(text)
+
+
+class ParseCache:
+    """Bounded, expiring LRU cache of parse results per (model, normalized text)"""
+
+    def __init__(self, maxsize: int = DEFAULT_SIZE, ttl: float = DEFAULT_TTL,
+                 max_length: int = DEFAULT_MAX_LENGTH, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_length = max_length
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[Any, Text], Tuple[float, Dict[Text, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.skipped = 0
+
+    def cacheable(self, text: Optional[Text]) -> bool:
+        # "/intent" messages bypass the NLU pipeline already.
+        return bool(text) and len(text) <= self.max_length and not text.startswith("/")
+
+    def get(self, model: Any, text: Text) -> Optional[Dict[Text, Any]]:
+        """A copy of the cached parse for ``text``, with its text and entity
+        spans rewritten for this message; None on a miss"""
+        key, origins = normalize(text)
+        entry = self._entries.get((model, key))
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, parsed = entry
+        if expires <= self.clock():
+            del self._entries[(model, key)]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end((model, key))
+        self.hits += 1
+
+        result = copy.deepcopy(parsed)
+        result["text"] = text
+        for entity in result.get("entities") or ():
+            if "start" not in entity or "end" not in entity:
+                continue
+            literal = entity.pop("_literal", False)
+            entity["start"] = _to_text(entity["start"], origins, text)
+            entity["end"] = _to_text(entity["end"] - 1, origins, text) + 1 if entity["end"] > 0 else 0
+            if literal:
+                entity["value"] = text[entity["start"]:entity["end"]]
+        return result
+
+    def put(self, model: Any, text: Text, parsed: Dict[Text, Any]) -> None:
+        key, origins = normalize(text)
+        stored = copy.deepcopy(parsed)
+        stored.pop("text", None)
+        for entity in stored.get("entities") or ():
+            if "start" not in entity or "end" not in entity:
+                continue
+            # Values that are just the matched text follow each message's
+            # spelling; synonym-mapped values are kept as they are.
+            entity["_literal"] = entity.get("value") == text[entity["start"]:entity["end"]]
+            entity["start"] = _to_key(entity["start"], origins)
+            entity["end"] = _to_key(entity["end"], origins)
+
+        self._entries[(model, key)] = (self.clock() + self.ttl, stored)
+        self._entries.move_to_end((model, key))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[Text, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "skipped": self.skipped,
+        }
+
+
+def model_id(processor: Any) -> Any:
+    """Identity of the model a processor serves"""
+    metadata = getattr(processor, "model_metadata", None)
+    return getattr(metadata, "model_id", None) or getattr(processor, "model_filename", None) or id(processor)
+
+
+def install(processor: Any, cache: ParseCache) -> None:
+    """Route ``processor.parse_message`` through the cache
+
+    The processor keeps its own ``parse_message`` underneath, so every
+    caller (the channels, ``/model/parse``, the dialogue loop) shares one
+    cache. Loading a model creates a new processor; the cache is cleared
+    when it gets installed there.
+    """
+    if getattr(processor.parse_message, "parse_cache", None) is cache:
+        return
+    parse_message = processor.parse_message
+    model = model_id(processor)
+    cache.clear()
+
+    async def cached_parse_message(message: Any, *args: Any, **kwargs: Any) -> Dict[Text, Any]:
+        text = getattr(message, "text", None)
+        if not cache.cacheable(text):
+            cache.skipped += 1
+            return await parse_message(message, *args, **kwargs)
+        key = (model, bool(kwargs.get("only_output_properties", True)))
+        parsed = cache.get(key, text)
+        if parsed is None:
+            parsed = await parse_message(message, *args, **kwargs)
+            cache.put(key, text, parsed)
+        else:
+            if "message_id" in parsed:
+                parsed["message_id"] = message.message_id
+            if "metadata" in parsed:
+                parsed["metadata"] = message.metadata
+        return parsed
+
+    cached_parse_message.parse_cache = cache  # type: ignore[attr-defined]
+    processor.parse_message = cached_parse_message
+    logger.info("NLU parse cache installed for model %s.", model)
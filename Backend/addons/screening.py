@@ -0,0 +1,47 @@
+"""Emergency screening inside the Rasa server process.
+
+The REST channel and the compacting tracker store run in the Rasa server,
+not in the action server, so they keep a knowledge base snapshot of their
+own. It is built from ``actions.kb`` and ``actions.knowledge`` without
+importing the actions themselves, and it follows knowledge base edits: the
+caller checks the files at most every ``HEALTH_KB_RELOAD_INTERVAL``
+seconds, so no thread is started here.
+"""
+
+import threading
+import time
+from typing import Any, Optional
+
+
+class KnowledgeScreen:
+    """The current knowledge base snapshot of this process, loaded on first use"""
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval
+        self._watcher: Any = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Any:
+        from actions.kb import load_knowledge_base
+        from actions.knowledge import RELOAD_INTERVAL, KnowledgeBaseWatcher, KnowledgeSnapshot
+
+        interval = RELOAD_INTERVAL if self.interval is None else self.interval
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = KnowledgeBaseWatcher(
+                    KnowledgeSnapshot(load_knowledge_base()), lambda snapshot: None, interval=interval
+                )
+                self._next_check = time.monotonic() + interval
+            elif interval > 0 and time.monotonic() >= self._next_check:
+                self._watcher.check()
+                self._next_check = time.monotonic() + interval
+            return self._watcher.current
+
+
+SCREEN = KnowledgeScreen()
+
+
+def emergency_detector() -> Any:
+    """The emergency matcher of the current knowledge base"""
+    return SCREEN.snapshot().emergency_detector
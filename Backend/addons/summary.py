@@ -0,0 +1,79 @@
+"""Conversation summaries folded from serialised tracker events.
+
+``CompactingTrackerStore`` replaces the events it drops with one
+``conversation_summary`` slot. The summary is worked out here from the
+events' dicts (``Event.as_dict()``), so none of this needs Rasa.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Text
+
+SUMMARY_SLOT = "conversation_summary"
+
+
+def empty_summary() -> Dict[Text, Any]:
+    return {
+        "symptoms": [],
+        "emergency_keyword": False,
+        "emergency_flagged": False,
+        "identified_ailment": None,
+    }
+
+
+def cut(events: Sequence[Dict[Text, Any]], keep_events: int) -> Optional[int]:
+    """Index where the kept window starts; None if nothing can be dropped
+
+    The window starts at a user message, so every kept turn is whole.
+    """
+    for i in range(max(len(events) - keep_events, 0), len(events)):
+        if events[i].get("event") == "user":
+            return i or None
+    return None
+
+
+def summarize(events: Iterable[Dict[Text, Any]], has_keyword: Callable[[Text], bool]) -> Dict[Text, Any]:
+    """Summary of the events, including any summary an earlier compaction left"""
+    summary = empty_summary()
+    for event in events:
+        kind = event.get("event")
+        if kind == "session_started":
+            summary = empty_summary()
+        elif kind == "slot":
+            name, value = event.get("name"), event.get("value")
+            if name == SUMMARY_SLOT and isinstance(value, dict):
+                summary["symptoms"].extend(value.get("symptoms") or ())
+                summary["emergency_keyword"] |= bool(value.get("emergency_keyword"))
+                summary["emergency_flagged"] |= bool(value.get("emergency_flagged"))
+                summary["identified_ailment"] = value.get("identified_ailment") or summary["identified_ailment"]
+            elif name == "symptoms" and value:
+                summary["symptoms"].extend(value if isinstance(value, list) else [value])
+            elif name == "emergency_case" and value:
+                summary["emergency_flagged"] = True
+            elif name == "identified_ailment" and value:
+                summary["identified_ailment"] = value
+        elif kind == "user":
+            entities = (event.get("parse_data") or {}).get("entities") or ()
+            summary["symptoms"].extend(
+                entity["value"] for entity in entities
+                if entity.get("entity") == "symptom" and entity.get("value")
+            )
+            text = event.get("text")
+            if text and not summary["emergency_keyword"]:
+                summary["emergency_keyword"] = has_keyword(text)
+    summary["symptoms"] = list(dict.fromkeys(summary["symptoms"]))
+    return summary
+
+
+def cleared_summary(latest_first: Iterable[Dict[Text, Any]]) -> Optional[Dict[Text, Any]]:
+    """The summary a reset cleared, given the session's events latest first
+
+    Only ``AllSlotsReset`` clears the slot without a ``SlotSet`` of its own,
+    so the latest ``SlotSet`` of the slot in the session holds the summary
+    to set again. None if there is none, or if it cleared the slot itself.
+    """
+    for event in latest_first:
+        kind = event.get("event")
+        if kind == "session_started":
+            return None
+        if kind == "slot" and event.get("name") == SUMMARY_SLOT:
+            return event.get("value")
+    return None
@@ -0,0 +1,112 @@
+"""In-memory tracker store that compacts long conversations.
+
+The default in-memory store keeps every event forever, and Rasa sends the
+whole history to the action server on every action call. Once a tracker
+holds more than ``max_events`` events, this store folds all but roughly the
+last ``keep_events`` into a ``conversation_summary`` slot:
+
+* ``symptoms``: every symptom reported in the compacted part, in order
+* ``emergency_keyword``: whether a compacted user message contained an
+  emergency keyword from the knowledge base
+* ``emergency_flagged``: whether ``emergency_case`` was ever set
+* ``identified_ailment``: the last ailment identified
+
+The slots and the active form at the cut are replayed as events in front
+of the kept window, so the dialogue continues exactly as before. A new
+session starts a new summary, as the action server only gets the current
+session's events; a summary carried over with the slots is kept. The
+summary also outlives ``AllSlotsReset`` (``action_restart``, an emergency
+alert): the events it stands for are gone, so the store sets it again
+on the copy it keeps of a tracker whose reset cleared it. The tracker
+passed to ``save`` is never changed. The summary itself is worked out in
+:mod:`addons.summary`.
+
+Configure it in ``endpoints.yml``::
+
+    tracker_store:
+      type: addons.tracker_store.CompactingTrackerStore
+      max_events: 200
+      keep_events: 60
+"""
+
+import logging
+from typing import Any, List, Optional
+
+from rasa.core.brokers.broker import EventBroker
+from rasa.core.tracker_store import InMemoryTrackerStore
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActiveLoop, Event, SessionStarted, SlotSet
+from rasa.shared.core.trackers import DialogueStateTracker
+
+from .screening import emergency_detector
+from .summary import SUMMARY_SLOT, cleared_summary, cut, summarize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_EVENTS = 200
+DEFAULT_KEEP_EVENTS = 60
+
+
+class CompactingTrackerStore(InMemoryTrackerStore):
+    """``InMemoryTrackerStore`` keeping a bounded window of raw events per conversation"""
+
+    def __init__(self, domain: Domain, event_broker: Optional[EventBroker] = None,
+                 max_events: int = DEFAULT_MAX_EVENTS, keep_events: int = DEFAULT_KEEP_EVENTS,
+                 **kwargs: Any):
+        super().__init__(domain, event_broker, **kwargs)
+        self.max_events = int(max_events)
+        self.keep_events = min(int(keep_events), self.max_events)
+
+    @property
+    def detector(self) -> Any:
+        return emergency_detector()
+
+    async def save(self, tracker: DialogueStateTracker) -> None:
+        tracker = self.restore_summary(tracker)
+        # The broker is sent the original events before they are compacted.
+        if self.event_broker:
+            await self.stream_events(tracker)
+        if len(tracker.events) > self.max_events:
+            tracker = self.compact(tracker)
+        self.store[tracker.sender_id] = self.serialise_tracker(tracker)
+
+    @staticmethod
+    def restore_summary(tracker: DialogueStateTracker) -> DialogueStateTracker:
+        """The tracker, or a copy with the summary slot set again if a reset cleared it"""
+        if tracker.get_slot(SUMMARY_SLOT) is not None:
+            return tracker
+        summary = cleared_summary(
+            event.as_dict() for event in reversed(tracker.events)
+            if isinstance(event, (SessionStarted, SlotSet))
+        )
+        if summary is None:
+            return tracker
+        tracker = tracker.copy()
+        tracker.update(SlotSet(SUMMARY_SLOT, summary))
+        return tracker
+
+    def compact(self, tracker: DialogueStateTracker) -> DialogueStateTracker:
+        """A tracker holding a summary, the state at the cut and the recent events"""
+        events = list(tracker.events)
+        at = cut([event.as_dict() for event in events], self.keep_events)
+        if at is None:
+            return tracker
+
+        dropped = events[:at]
+        state = DialogueStateTracker.from_events(tracker.sender_id, dropped, slots=self.domain.slots)
+        timestamp = events[at].timestamp
+        prefix: List[Event] = [
+            SlotSet(name, slot.value, timestamp=timestamp)
+            for name, slot in state.slots.items()
+            if name != SUMMARY_SLOT and slot.value != slot.initial_value
+        ]
+        if state.active_loop_name:
+            prefix.append(ActiveLoop(state.active_loop_name, timestamp=timestamp))
+        summary = summarize((event.as_dict() for event in dropped), self.detector.has_keyword)
+        prefix.append(SlotSet(SUMMARY_SLOT, summary, timestamp=timestamp))
+
+        logger.debug("Compacted %s events of conversation %s.", at, tracker.sender_id)
+        return DialogueStateTracker.from_events(
+            tracker.sender_id, prefix + events[at:], slots=self.domain.slots,
+            sender_source=tracker.sender_source,
+        )
@@ -0,0 +1,163 @@
+"""Incremental training for content edits.
+
+A knowledge base or NLU edit otherwise means ``rasa train`` from scratch:
+every example is featurized again and DIET, the ResponseSelector,
+UnexpecTEDIntentPolicy and TEDPolicy each run all their epochs. Run from
+the ``Backend`` directory instead::
+
+    python -m addons.train                     # fine-tune the last model if possible
+    python -m addons.train --full              # train from scratch
+
+Before training, the NLU data generated from the knowledge base is brought
+up to date (see ``actions.nlu_data``). Then:
+
+* Nothing is trained when the config, domain and data hash the same as
+  for the last model trained here.
+* Rasa's training cache, which stores the output of every pipeline and
+  policy step under a hash of its configuration and inputs, is kept in
+  ``--cache-dir``. Steps whose inputs did not change are loaded instead of
+  run: an NLU-only edit does not retrain the policies, and a story-only
+  edit does not retrain NLU. Keep the directory between builds.
+* The steps that did change are fine-tuned from the last model, for
+  ``--epoch-fraction`` of their configured epochs, using Rasa's
+  ``--finetune`` mode.
+* Rasa refuses to fine-tune after a change to the pipeline or policy
+  config, or to the intents, entities, slots or actions; the model is then
+  trained from scratch. So is every ``--max-finetunes``-th model, so that
+  fine-tunes do not pile up on each other indefinitely.
+
+The state is kept in ``<models>/train_manifest.json``.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Text
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "train_manifest.json"
+DEFAULT_EPOCH_FRACTION = 0.2
+DEFAULT_MAX_FINETUNES = 5
+
+
+def training_files(data: Text) -> List[Text]:
+    if os.path.isfile(data):
+        return [data]
+    return sorted(
+        path for pattern in ("*.yml", "*.yaml", "*.md", "*.json")
+        for path in glob.glob(os.path.join(data, "**", pattern), recursive=True)
+    )
+
+
+def inputs_hash(config: Text, domain: Text, data: Text) -> Text:
+    """Hash of everything a training run reads"""
+    digest = hashlib.sha256()
+    for path in [config, domain, *training_files(data)]:
+        digest.update(path.encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def read_manifest(models: Text) -> Dict[Text, Any]:
+    try:
+        with open(os.path.join(models, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(models: Text, manifest: Dict[Text, Any]) -> None:
+    path = os.path.join(models, MANIFEST)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    os.replace(f"{path}.tmp", path)
+
+
+def train(config: Text, domain: Text, data: Text, models: Text,
+          finetune: Optional[Text], epoch_fraction: float) -> Optional[Text]:
+    """Train with Rasa; the path of the new model, or None if training failed"""
+    from rasa.model_training import train as rasa_train
+
+    result = rasa_train(
+        domain, config, data, output=models,
+        model_to_finetune=finetune,
+        finetuning_epoch_fraction=epoch_fraction if finetune else 1.0,
+    )
+    return result.model if result.code == 0 else None
+
+
+def main(argv: Optional[List[Text]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Retrain the assistant, fine-tuning the last model when possible.")
+    parser.add_argument("-c", "--config", default="config.yml")
+    parser.add_argument("-d", "--domain", default="domain.yml")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--out", default="models", help="Directory of the trained models.")
+    parser.add_argument("--cache-dir", default=os.path.join(".rasa", "cache"),
+                        help="Rasa's training cache; keep it between builds.")
+    parser.add_argument("--cache-size", type=int, default=4000, help="Training cache size limit in MB.")
+    parser.add_argument("--epoch-fraction", type=float, default=DEFAULT_EPOCH_FRACTION,
+                        help="Share of the configured epochs run when fine-tuning.")
+    parser.add_argument("--max-finetunes", type=int, default=DEFAULT_MAX_FINETUNES,
+                        help="Fine-tuned models in a row before one is trained from scratch.")
+    parser.add_argument("--full", action="store_true", help="Train from scratch.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s - %(message)s")
+
+    # Read by Rasa when the training cache is created.
+    os.environ.setdefault("RASA_CACHE_DIRECTORY", args.cache_dir)
+    os.environ.setdefault("RASA_MAX_CACHE_SIZE", str(args.cache_size))
+
+    from actions.nlu_data import write as write_nlu_data
+
+    if write_nlu_data():
+        logger.info("Regenerated the NLU data from the knowledge base.")
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = read_manifest(args.out)
+    inputs = inputs_hash(args.config, args.domain, args.data)
+    previous = manifest.get("model")
+    if previous and not os.path.isfile(previous):
+        previous = None
+
+    if previous and manifest.get("inputs") == inputs and not args.full:
+        print(f"{previous} is up to date.")
+        return
+
+    finetunes = int(manifest.get("finetunes", 0))
+    finetune = previous if previous and not args.full and finetunes < args.max_finetunes else None
+    started = time.monotonic()
+    model = None
+    if finetune:
+        from rasa.shared.exceptions import InvalidConfigException
+
+        logger.info("Fine-tuning %s for %s of the configured epochs.", finetune, args.epoch_fraction)
+        try:
+            model = train(args.config, args.domain, args.data, args.out, finetune, args.epoch_fraction)
+        except InvalidConfigException as e:
+            logger.info("Cannot fine-tune (%s); training from scratch.", e)
+            finetune = None
+    if not finetune:
+        logger.info("Training from scratch.")
+        model = train(args.config, args.domain, args.data, args.out, None, 1.0)
+    if model is None:
+        sys.exit(1)
+
+    write_manifest(args.out, {
+        "model": model,
+        "inputs": inputs,
+        "finetunes": finetunes + 1 if finetune else 0,
+        "base": manifest.get("base") if finetune else model,
+    })
+    print(f"{'Fine-tuned' if finetune else 'Trained'} {model} in {time.monotonic() - started:.0f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+"""Replay the bot's stories as concurrent users against the REST channel.
+
+Every story in ``data/stories.yml`` and ``tests/test_stories.yml`` becomes a
+script of user messages. ``user:`` steps are sent verbatim, ``intent:``
+steps as a random training example of that intent, and the slots a story
+fills through a form are answered one turn each. Conversations arrive at
+``--rate`` per second (Poisson arrivals), at most ``--concurrency`` run at
+once, and every turn is posted to the ``rest`` channel from
+``credentials.yml`` (``/webhooks/rest/webhook``).
+
+Start Rasa with its HTTP API, so each conversation's tracker can be fetched
+afterwards, then run from the ``Backend`` directory::
+
+    rasa run --enable-api
+    python -m benchmarks.loadgen --users 500 --concurrency 50 --rate 25
+
+The load generator itself serves the ``action_endpoint`` port from
+``endpoints.yml`` (5055). By default it answers every action with a stub:
+form validations accept the extracted slots and other actions send one
+message, optionally after ``--stub-delay`` ms. This load-tests Rasa offline
+and without the custom actions. With ``--action-server`` the calls are
+forwarded to a real action server on another port instead, e.g. one started
+with ``python -m actions.supervisor -p 5056``.
+
+Each turn's latency is split using the tracker's event timestamps and the
+action calls timed at the endpoint:
+
+* ``nlu``: from sending the message until Rasa logged the parsed message,
+  including any wait for the conversation's lock
+* ``action``: time spent in action server calls during the turn
+* ``policy``: the rest of the time until Rasa predicted ``action_listen``
+* ``total``: until the webhook responded
+
+The breakdown relies on Rasa and the load generator sharing a clock, so run
+both on the same host.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Text, Tuple
+from urllib.parse import quote, urlsplit
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORIES = (
+    os.path.join(BACKEND, "data", "stories.yml"),
+    os.path.join(BACKEND, "tests", "test_stories.yml"),
+)
+NLU = os.path.join(BACKEND, "data", "nlu.yml")
+WEBHOOK = "/webhooks/rest/webhook"
+# Form answers that are lists (the symptoms) open the intake message.
+INTAKE = "I have {}"
+# Reconnect rather than reuse a connection the server may have timed out.
+KEEP_ALIVE = 2.0
+STAGES = ("total", "nlu", "policy", "action")
+
+# "[3 days](duration)" or '[3 days]{"entity": "duration"}' -> "3 days"
+_ENTITY = re.compile(r"\[([^\]]+)\](?:\([^)]*\)|\{[^}]*\})")
+
+
+def _read_yaml(path: Text) -> Dict[Text, Any]:
+    from ruamel.yaml import YAML
+
+    with open(path, encoding="utf-8") as f:
+        return YAML(typ="safe").load(f) or {}
+
+
+def _plain(text: Text) -> Text:
+    return _ENTITY.sub(r"\1", text).strip()
+
+
+def _answer(value: Any) -> Text:
+    return " and ".join(map(str, value)) if isinstance(value, list) else str(value)
+
+
+class Message(NamedTuple):
+    """A user turn given as text, or as an intent to pick an example of"""
+
+    text: Optional[Text] = None
+    intent: Optional[Text] = None
+
+
+class Script(NamedTuple):
+    story: Text
+    messages: Tuple[Message, ...]
+
+
+def training_examples(path: Text = NLU) -> Dict[Text, List[Text]]:
+    """Plain text examples of every intent in an NLU file"""
+    examples: Dict[Text, List[Text]] = {}
+    for item in _read_yaml(path).get("nlu") or []:
+        if "intent" in item:
+            examples.setdefault(item["intent"], []).extend(
+                _plain(line[2:]) for line in (item.get("examples") or "").splitlines()
+                if line.strip().startswith("- ")
+            )
+    return examples
+
+
+def _steps(steps: Sequence[Dict[Text, Any]]) -> List[Dict[Text, Any]]:
+    # "or" alternatives are replayed as their first option.
+    flat = []
+    for step in steps:
+        if "or" in step:
+            flat.extend(_steps(step["or"][:1]))
+        else:
+            flat.append(step)
+    return flat
+
+
+def story_scripts(path: Text) -> List[Script]:
+    """The user turns of every story in a story file"""
+    scripts = []
+    for story in _read_yaml(path).get("stories") or []:
+        messages: List[Message] = []
+        form = False
+        for step in _steps(story.get("steps") or []):
+            if "user" in step:
+                messages.append(Message(text=_plain(step["user"])))
+                form = False
+            elif "intent" in step:
+                messages.append(Message(intent=step["intent"]))
+                form = False
+            elif step.get("active_loop"):
+                form = True
+            elif "slot_was_set" in step and form:
+                for slot in step["slot_was_set"]:
+                    if not isinstance(slot, dict):
+                        continue
+                    for name, value in slot.items():
+                        if name == "requested_slot" or value is None:
+                            continue
+                        if isinstance(value, list) and messages and messages[-1].intent:
+                            messages[-1] = Message(text=INTAKE.format(_answer(value)))
+                        else:
+                            messages.append(Message(text=_answer(value)))
+                form = False
+        if messages:
+            scripts.append(Script(story.get("story") or story.get("rule") or "", tuple(messages)))
+    return scripts
+
+
+def render(script: Script, examples: Dict[Text, List[Text]], rng: random.Random) -> List[Text]:
+    """The texts one synthetic user sends; intents without examples are sent as "/intent" """
+    return [
+        message.text if message.text is not None
+        else rng.choice(examples[message.intent]) if examples.get(message.intent)
+        else f"/{message.intent}"
+        for message in script.messages
+    ]
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 client connection, opened on first use"""
+
+    def __init__(self, url: Text):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 80
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._used = 0.0
+
+    async def request(self, method: Text, path: Text, body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        if self._writer is not None and time.monotonic() - self._used > KEEP_ALIVE:
+            self.close()
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = body or b""
+        try:
+            self._writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                + body
+            )
+            await self._writer.drain()
+            status, headers, payload = await read_message(self._reader, response=True)
+        except BaseException:
+            self.close()
+            raise
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        self._used = time.monotonic()
+        return int(status.split()[1]), payload
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+async def read_message(reader: asyncio.StreamReader, response: bool = False
+                       ) -> Tuple[Text, Dict[Text, Text], bytes]:
+    """Read one HTTP/1.1 request or response: start line, headers, body"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    start, *lines = head[:-4].decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", ""):
+        chunks = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            chunks.append(await reader.readexactly(size + 2))
+            if size == 0:
+                break
+        return start, headers, b"".join(chunk[:-2] for chunk in chunks)
+    if "content-length" in headers:
+        return start, headers, await reader.readexactly(int(headers["content-length"]))
+    return start, headers, (await reader.read() if response else b"")
+
+
+def stub_response(call: Dict[Text, Any]) -> Dict[Text, Any]:
+    """Stand-in for the custom actions
+
+    Form validations accept every slot Rasa extracted since the last user
+    message, which is what the tracker sent along with the call holds;
+    other actions just send one message naming themselves.
+    """
+    name = call.get("next_action") or ""
+    if name.startswith("validate_"):
+        events = (call.get("tracker") or {}).get("events") or []
+        last_user = max((i for i, event in enumerate(events) if event.get("event") == "user"), default=-1)
+        return {
+            "events": [
+                {"event": "slot", "name": event["name"], "value": event.get("value")}
+                for event in events[last_user + 1:] if event.get("event") == "slot"
+            ],
+            "responses": [],
+        }
+    return {"events": [], "responses": [{"text": f"({name})"}]}
+
+
+class ActionEndpoint:
+    """Serves the action endpoint, timing every call per conversation
+
+    Calls are answered by :func:`stub_response` or, given ``upstream``,
+    forwarded to a real action server.
+    """
+
+    def __init__(self, upstream: Optional[Text] = None, stub_delay: float = 0.0):
+        self.upstream = upstream
+        self.upstream_path = (urlsplit(upstream).path or "/webhook") if upstream else None
+        self.stub_delay = stub_delay
+        self.calls: Dict[Text, List[Tuple[float, float]]] = {}
+        self._idle: List[Connection] = []
+
+    async def _answer(self, body: bytes) -> Tuple[int, bytes]:
+        if self.upstream is None:
+            if self.stub_delay:
+                await asyncio.sleep(self.stub_delay)
+            return 200, json.dumps(stub_response(json.loads(body))).encode("utf-8")
+        connection = self._idle.pop() if self._idle else Connection(self.upstream)
+        result = await connection.request("POST", self.upstream_path, body)
+        self._idle.append(connection)
+        return result
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    _, _, body = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                started = time.time()
+                try:
+                    status, payload = await self._answer(body)
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    status, payload = 502, b""
+                sender_id = None
+                try:
+                    sender_id = json.loads(body).get("sender_id")
+                except (ValueError, AttributeError):
+                    pass
+                self.calls.setdefault(sender_id, []).append((started, time.time()))
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+                    .encode("latin-1") + payload
+                )
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, "127.0.0.1", port, reuse_address=True)
+
+
+class Turn(NamedTuple):
+    sent: float
+    received: float
+    status: int
+
+
+def breakdown(turns: Sequence[Turn], events: Sequence[Dict[Text, Any]],
+              calls: Sequence[Tuple[float, float]]) -> List[Dict[Text, float]]:
+    """Per-turn stage latencies in ms from a conversation's tracker events"""
+    users = [i for i, event in enumerate(events) if event.get("event") == "user"]
+    stages = []
+    for turn, start in zip((turn for turn in turns if turn.status == 200), users):
+        logged = events[start]["timestamp"]
+        listened = next(
+            (event["timestamp"] for event in events[start + 1:]
+             if event.get("event") == "action" and event.get("name") == "action_listen"),
+            turn.received,
+        )
+        action = sum(end - begin for begin, end in calls if turn.sent <= begin <= turn.received)
+        stages.append({
+            "total": (turn.received - turn.sent) * 1000,
+            "nlu": max(0.0, logged - turn.sent) * 1000,
+            "policy": max(0.0, listened - logged - action) * 1000,
+            "action": action * 1000,
+        })
+    return stages
+
+
+def summarize(samples: Sequence[float]) -> Dict[Text, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 2)
+
+    return {
+        "mean_ms": round(sum(ordered) / len(ordered), 2),
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+class LoadGenerator:
+    def __init__(self, url: Text, scripts: Sequence[Script], examples: Dict[Text, List[Text]],
+                 endpoint: ActionEndpoint, token: Optional[Text] = None, think_time: float = 0.0,
+                 seed: int = 0):
+        self.url = url
+        self.scripts = scripts
+        self.examples = examples
+        self.endpoint = endpoint
+        self.token = token
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.run_id = f"{int(time.time()):x}"
+        self.turns: Dict[Text, List[Turn]] = {}
+        self.stories: Dict[Text, Text] = {}
+        self.errors = 0
+
+    async def converse(self, sender_id: Text, texts: List[Text]) -> None:
+        connection = Connection(self.url)
+        turns = self.turns[sender_id] = []
+        try:
+            for text in texts:
+                sent = time.time()
+                try:
+                    status, _ = await connection.request(
+                        "POST", WEBHOOK, json.dumps({"sender": sender_id, "message": text}).encode("utf-8")
+                    )
+                except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    status = 0
+                turns.append(Turn(sent, time.time(), status))
+                if status != 200:
+                    self.errors += 1
+                    return
+                if self.think_time:
+                    await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+        finally:
+            connection.close()
+
+    async def run(self, users: int, concurrency: int, rate: float, duration: Optional[float]) -> float:
+        """Start ``users`` conversations; returns the wall time taken"""
+        slots = asyncio.Semaphore(concurrency)
+        tasks = []
+        started = time.time()
+
+        async def user(sender_id: Text, texts: List[Text]) -> None:
+            try:
+                await self.converse(sender_id, texts)
+            finally:
+                slots.release()
+
+        for n in range(users):
+            if rate > 0:
+                await asyncio.sleep(self.rng.expovariate(rate))
+            if duration is not None and time.time() - started >= duration:
+                break
+            # Arrivals that find every slot busy wait for one.
+            await slots.acquire()
+            script = self.scripts[n % len(self.scripts)]
+            sender_id = f"loadgen-{self.run_id}-{n}"
+            self.stories[sender_id] = script.story
+            tasks.append(asyncio.create_task(user(sender_id, render(script, self.examples, self.rng))))
+        await asyncio.gather(*tasks)
+        return time.time() - started
+
+    async def tracker_events(self, sender_id: Text, connection: Connection) -> Optional[List[Dict[Text, Any]]]:
+        path = f"/conversations/{quote(sender_id)}/tracker?include_events=ALL"
+        if self.token:
+            path += f"&token={quote(self.token)}"
+        try:
+            status, body = await connection.request("GET", path)
+        except (OSError, asyncio.IncompleteReadError):
+            return None
+        return json.loads(body).get("events") if status == 200 else None
+
+    async def report(self, elapsed: float) -> Dict[Text, Any]:
+        samples: Dict[Text, List[float]] = {stage: [] for stage in STAGES}
+        missing = 0
+        connection = Connection(self.url)
+        try:
+            for sender_id, turns in self.turns.items():
+                events = await self.tracker_events(sender_id, connection)
+                if events is None:
+                    missing += 1
+                    samples["total"].extend((t.received - t.sent) * 1000 for t in turns if t.status == 200)
+                    continue
+                for stages in breakdown(turns, events, self.endpoint.calls.get(sender_id, ())):
+                    for stage, value in stages.items():
+                        samples[stage].append(value)
+        finally:
+            connection.close()
+
+        completed = sum(1 for turns in self.turns.values() if turns and turns[-1].status == 200)
+        turns = sum(len(turns) for turns in self.turns.values())
+        return {
+            "conversations": len(self.turns),
+            "completed": completed,
+            "turns": turns,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 2),
+            "turns_per_sec": round(turns / elapsed, 1) if elapsed else 0.0,
+            "without_tracker": missing,
+            "latency": {stage: summarize(values) for stage, values in samples.items()},
+        }
+
+
+def print_report(report: Dict[Text, Any]) -> None:
+    print(f"{report['completed']}/{report['conversations']} conversations, {report['turns']} turns"
+          f" in {report['elapsed_s']} s ({report['turns_per_sec']} turns/s), {report['errors']} errors",
+          file=sys.stderr)
+    if report["without_tracker"]:
+        print(f"No tracker for {report['without_tracker']} conversations; run Rasa with --enable-api"
+              " (and pass --token if it uses one) for the stage breakdown.", file=sys.stderr)
+    for stage in STAGES:
+        latency = report["latency"][stage]
+        if latency:
+            print(f"{stage:<8} {latency['p50_ms']:>10.1f} ms p50 {latency['p90_ms']:>10.1f} ms p90"
+                  f" {latency['p99_ms']:>10.1f} ms p99 {latency['max_ms']:>10.1f} ms max", file=sys.stderr)
+
+
+async def _main(args: argparse.Namespace) -> Dict[Text, Any]:
+    scripts = [script for path in args.stories.split(",") for script in story_scripts(path)]
+    if not scripts:
+        raise SystemExit("No stories to replay.")
+    endpoint = ActionEndpoint(args.action_server, args.stub_delay / 1000)
+    server = await endpoint.start(args.action_port)
+    try:
+        generator = LoadGenerator(args.url, scripts, training_examples(args.nlu), endpoint,
+                                  args.token, args.think_time, args.seed)
+        elapsed = await generator.run(args.users, args.concurrency, args.rate, args.duration)
+        return await generator.report(elapsed)
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def main(argv: Optional[List[Text]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay the stories as concurrent users against the REST channel.")
+    parser.add_argument("--url", default="http://localhost:5005", help="Rasa server.")
+    parser.add_argument("--token", help="Auth token of the Rasa HTTP API, if it uses one.")
+    parser.add_argument("--users", type=int, default=100, help="Conversations to start.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Conversations in progress at once.")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="New conversations per second; 0 starts them as soon as a slot frees up.")
+    parser.add_argument("--duration", type=float, help="Stop starting conversations after this many seconds.")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between a user's turns (s).")
+    parser.add_argument("--stories", default=",".join(STORIES), help="Comma-separated story files.")
+    parser.add_argument("--nlu", default=NLU, help="Training data to draw intent examples from.")
+    parser.add_argument("--action-port", type=int, default=5055, help="Port of the action endpoint to serve.")
+    parser.add_argument("--action-server", help="Forward action calls here instead of stubbing them.")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="Stub action latency (ms).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report JSON to this file.")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(_main(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
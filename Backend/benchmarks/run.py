@@ -0,0 +1,314 @@
+"""Micro-benchmarks for the custom action hot paths.
+
+Every action ``run``, the ``ValidateSymptomForm`` validators and the
+``StudentHealthDatabase`` lookups are timed against synthetic trackers of
+several history lengths and against the knowledge base scaled up
+synthetically. For each case the suite reports throughput, p50/p99 latency
+and the peak memory allocated by one call. It also times both scoring paths
+of ``ScoringEngine`` on the same matches and records, as
+``scoring_crossover``, from how many postings the numpy path wins.
+
+Run from the ``Backend`` directory::
+
+    python -m benchmarks.run                      # print results
+    python -m benchmarks.run --save               # refresh the stored baseline
+    python -m benchmarks.run --compare            # fail on regressions
+
+Run with ``HEALTH_METRICS=1`` to measure the overhead of the action
+instrumentation against a baseline recorded without it.
+
+Timings depend on the machine, so compare against a baseline recorded on
+the same hardware.
+"""
+
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Text
+
+os.environ.setdefault("HEALTH_KB_RELOAD_INTERVAL", "0")
+
+from rasa_sdk import Tracker  # noqa: E402
+from rasa_sdk.executor import CollectingDispatcher  # noqa: E402
+
+from actions import actions  # noqa: E402
+from actions.kb import KnowledgeBase, compile_kb, read_source  # noqa: E402
+from actions.knowledge import KnowledgeSnapshot  # noqa: E402
+from actions.scoring import MIN_VECTOR_CANDIDATES  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+SYMPTOM_SETS = [
+    ["headache", "nausea"],
+    ["fever", "cough", "sore throat"],
+    ["stomach pain"],
+    ["fatigue", "difficulty concentrating", "headake"],
+]
+
+USER_TEXTS = [
+    "I have a headache and feel sick",
+    "it started about two days ago",
+    "moderate I guess",
+    "my throat is sore and I keep coughing",
+]
+
+BOT_TEXTS = [
+    "Can you describe the symptoms you're experiencing? Please be as detailed as possible.",
+    "How long have you been experiencing these symptoms?",
+    "How severe are your symptoms? Would you describe them as mild, moderate, or severe?",
+]
+
+
+def scaled_knowledge_base(scale: int) -> KnowledgeSnapshot:
+    """The real KB repeated ``scale`` times with distinct names and symptoms"""
+    data = read_source()
+    if scale > 1:
+        ailments = {}
+        for copy in range(scale):
+            for name, record in data["ailments"].items():
+                suffix = "" if copy == 0 else f" variant {copy}"
+                ailments[f"{name}{suffix.replace(' ', '_')}"] = dict(
+                    record, symptoms=[f"{symptom}{suffix}" for symptom in record["symptoms"]]
+                )
+        data = dict(data, ailments=ailments)
+    return KnowledgeSnapshot(KnowledgeBase(compile_kb(data, b"benchmark")))
+
+
+def synthetic_events(history: int) -> List[Dict[Text, Any]]:
+    events = []
+    for i in range(history):
+        if i % 2 == 0:
+            events.append({"event": "user", "timestamp": float(i), "text": USER_TEXTS[i // 2 % len(USER_TEXTS)]})
+        else:
+            events.append({"event": "bot", "timestamp": float(i), "text": BOT_TEXTS[i // 2 % len(BOT_TEXTS)]})
+    return events
+
+
+def synthetic_tracker(sender_id: Text, events: List[Dict[Text, Any]], **slots: Any) -> Tracker:
+    slots.setdefault("symptoms", SYMPTOM_SETS[0])
+    slots.setdefault("identified_ailment", "migraine")
+    slots.setdefault("severity", "moderate")
+    slots.setdefault("duration", "2 days")
+    latest = {"text": "it is kind of bad", "intent": {"name": "report_symptoms"}, "entities": []}
+    return Tracker(sender_id, slots, latest, events, False, None, {}, "action_listen")
+
+
+async def call(fn: Callable[[], Any]) -> Any:
+    result = fn()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def _measure(fn: Callable[[], Any], iterations: int, alloc_iterations: int) -> Dict[Text, float]:
+    # Runs on one event loop so async actions are timed without loop startup.
+    for _ in range(min(50, iterations)):
+        await call(fn)
+
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        await call(fn)
+        samples.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(alloc_iterations):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await call(fn)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(iterations / elapsed, 1),
+        "p50_us": round(samples[len(samples) // 2] / 1000, 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1000, 2),
+        "alloc_bytes": int(sum(peaks) / max(1, len(peaks))),
+    }
+
+
+def measure(fn: Callable[[], Any], iterations: int, alloc_iterations: int) -> Dict[Text, float]:
+    return asyncio.run(_measure(fn, iterations, alloc_iterations))
+
+
+def cases(history: int) -> Dict[Text, Callable[[], Any]]:
+    """Benchmarked callables; tracker-dependent ones are parameterized by history"""
+    events = synthetic_events(history)
+    senders = itertools.count()
+    symptom_sets = itertools.cycle(SYMPTOM_SETS)
+    db = actions.StudentHealthDatabase
+
+    def run_action(action_cls: type, cold: bool = False, **slots: Any) -> Callable[[], Any]:
+        action = action_cls()
+        warm_tracker = synthetic_tracker("warm", events, **slots)
+
+        def run() -> Any:
+            tracker = synthetic_tracker(f"cold-{next(senders)}", events, **slots) if cold else warm_tracker
+            return action.run(CollectingDispatcher(), tracker, {})
+        return run
+
+    def validate(method: Text, value: Any, **slots: Any) -> Callable[[], Any]:
+        validator = getattr(actions.ValidateSymptomForm(), method)
+        tracker = synthetic_tracker("validator", events, **slots)
+        return lambda: validator(value, CollectingDispatcher(), tracker, {})
+
+    return {
+        "identify_ailment": lambda: db.identify_ailment(next(symptom_sets)),
+        "identify_ailment[profile]": lambda: db.identify_ailment(next(symptom_sets), "2 days", "moderate"),
+        "check_emergency": lambda: db.check_emergency(next(symptom_sets)),
+        "ActionIdentifyAilment.run": run_action(actions.ActionIdentifyAilment, symptoms=["headache", "nausea"]),
+        "ActionRecommendTreatment.run": run_action(actions.ActionRecommendTreatment),
+        "ActionCheckEmergency.run[warm]": run_action(actions.ActionCheckEmergency),
+        "ActionCheckEmergency.run[cold]": run_action(actions.ActionCheckEmergency, cold=True),
+        "ActionProvideMedicationInfo.run": run_action(actions.ActionProvideMedicationInfo),
+        "ActionGivePreventionTips.run": run_action(actions.ActionGivePreventionTips),
+        "ActionRestart.run": run_action(actions.ActionRestart),
+        "ActionDefaultFallback.run": run_action(actions.ActionDefaultFallback),
+        "ValidateSymptomForm.validate_symptoms": validate("validate_symptoms", ["headache"]),
+        "ValidateSymptomForm.validate_duration": validate("validate_duration", "2 days"),
+        "ValidateSymptomForm.validate_severity": validate(
+            "validate_severity", "kind of bad", severity=None, requested_slot="severity"
+        ),
+    }
+
+
+TRACKER_CASES = (
+    "ActionCheckEmergency.run[warm]",
+    "ActionCheckEmergency.run[cold]",
+    "ValidateSymptomForm.validate_severity",
+)
+
+
+def run_suite(scales: List[int], histories: List[int], iterations: int,
+              alloc_iterations: int) -> Dict[Text, Dict[Text, float]]:
+    original = actions.StudentHealthDatabase.SNAPSHOT
+    results = {}
+    try:
+        for scale in scales:
+            actions.StudentHealthDatabase.install(scaled_knowledge_base(scale))
+            for history in histories:
+                for name, fn in cases(history).items():
+                    if history != histories[0] and name not in TRACKER_CASES:
+                        continue
+                    key = f"{name}[kb=x{scale}]"
+                    if name in TRACKER_CASES:
+                        key = f"{name}[kb=x{scale},history={history}]"
+                    results[key] = measure(fn, iterations, alloc_iterations)
+                    print(f"{key:<75} {results[key]['p50_us']:>10.1f} us p50"
+                          f" {results[key]['p99_us']:>10.1f} us p99"
+                          f" {results[key]['ops_per_sec']:>12.0f} ops/s"
+                          f" {results[key]['alloc_bytes']:>10} B", file=sys.stderr)
+    finally:
+        actions.StudentHealthDatabase.install(original)
+    return results
+
+
+def scoring_crossover(scales: List[int], iterations: int) -> Dict[Text, Any]:
+    """Time both ``ScoringEngine`` paths on the same matches at several sizes
+
+    ``postings`` is the smallest number of (matched symptom, ailment)
+    postings from which the numpy path was faster at every measured point;
+    compare it with ``actions.scoring.MIN_VECTOR_CANDIDATES``.
+    """
+    points = []
+    for scale in scales:
+        kb = scaled_knowledge_base(scale)
+        index, scorer = kb.symptom_index, kb.scorer
+        fit = kb.profiles.fit(48.0, "moderate")
+        for symptoms in SYMPTOM_SETS:
+            matches = [index.matching_symptoms(text.lower()) for text in symptoms]
+            # The best of a few rounds, so one busy moment does not move the crossover.
+            timings = {
+                path: min(measure(fn, iterations, 0)["p50_us"] for _ in range(3))
+                for path, fn in (
+                    ("dict_us", lambda: index.rank_scores(index.score_matches(matches), fit)[:3]),
+                    ("numpy_us", lambda: scorer.top_k_vectorized(matches, 3, fit)),
+                )
+            }
+            postings = sum(len(index.symptom_ailments[s]) for ids in matches for s in ids)
+            points.append({"kb": f"x{scale}", "postings": postings, **timings})
+            print(f"scoring[kb=x{scale},postings={postings}]".ljust(75)
+                  + f" {timings['dict_us']:>10.1f} us dict {timings['numpy_us']:>10.1f} us numpy",
+                  file=sys.stderr)
+    points.sort(key=lambda point: point["postings"])
+    crossover = None
+    for point in reversed(points):
+        if point["numpy_us"] >= point["dict_us"]:
+            break
+        crossover = point["postings"]
+    return {"postings": crossover, "points": points}
+
+
+def compare(results: Dict[Text, Dict[Text, float]], baseline: Dict[Text, Any],
+            tolerance: float) -> List[Text]:
+    """Cases whose p50 latency regressed by more than ``tolerance`` x baseline"""
+    regressions = []
+    for key, result in results.items():
+        reference = baseline["results"].get(key)
+        if reference and result["p50_us"] > reference["p50_us"] * tolerance:
+            regressions.append(
+                f"{key}: p50 {reference['p50_us']} us -> {result['p50_us']} us "
+                f"({result['p50_us'] / reference['p50_us']:.2f}x)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[Text]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the custom action hot paths.")
+    parser.add_argument("--kb-scales", default="1,10,100", help="Comma-separated KB size multipliers.")
+    parser.add_argument("--histories", default="10,100,1000", help="Comma-separated tracker event counts.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--alloc-iterations", type=int, default=50)
+    parser.add_argument("--output", help="Write the results JSON to this file.")
+    parser.add_argument("--save", action="store_true", help=f"Store the results as the baseline ({BASELINE}).")
+    parser.add_argument("--compare", action="store_true", help="Compare against the stored baseline.")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed p50 slowdown factor.")
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        [int(s) for s in args.kb_scales.split(",")],
+        [int(h) for h in args.histories.split(",")],
+        args.iterations,
+        args.alloc_iterations,
+    )
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "iterations": args.iterations,
+        "results": results,
+        "scoring_crossover": scoring_crossover(
+            sorted({1, 3, 10, 30, *(int(s) for s in args.kb_scales.split(","))}), args.iterations // 4
+        ),
+    }
+    crossover = report["scoring_crossover"]["postings"]
+    if crossover != MIN_VECTOR_CANDIDATES:
+        print(f"NOTE scoring crossover measured at {crossover} postings;"
+              f" actions.scoring.MIN_VECTOR_CANDIDATES is {MIN_VECTOR_CANDIDATES}", file=sys.stderr)
+
+    for path in filter(None, [args.output, BASELINE if args.save else None]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(BASELINE, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
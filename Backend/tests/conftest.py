@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The action server runs from Backend/, which makes `actions` and `addons`
+# importable; do the same for the tests.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
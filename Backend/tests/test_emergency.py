@@ -0,0 +1,70 @@
+import pytest
+
+from actions.emergency import AhoCorasick, EmergencyDetector
+
+
+def find(automaton, text):
+    return sorted((start, automaton.patterns[pattern_id]) for start, pattern_id in automaton.finditer(text))
+
+
+def naive(patterns, text):
+    return sorted(
+        (start, pattern) for pattern in dict.fromkeys(patterns)
+        for start in range(len(text) - len(pattern) + 1) if text.startswith(pattern, start)
+    )
+
+
+def test_overlapping_and_nested_matches():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    assert find(automaton, "ushers") == [(1, "she"), (2, "he"), (2, "hers")]
+
+
+def test_failure_links_fall_back_to_the_longest_suffix():
+    automaton = AhoCorasick(["abcd", "bcx", "c"])
+    # After "abc" misses "d", the automaton resumes from "bc", not the root.
+    assert find(automaton, "abcx") == [(1, "bcx"), (2, "c")]
+
+
+@pytest.mark.parametrize("patterns, text", [
+    (["aa", "aaa", "a"], "aaaa"),
+    (["chest pain", "pain", "chest", "st p"], "sharp chest pain and chest tightness"),
+    (["abab", "bab", "ba"], "abababab"),
+    (["x"], ""),
+])
+def test_matches_every_occurrence(patterns, text):
+    assert find(AhoCorasick(patterns), text) == naive(patterns, text)
+
+
+def test_duplicate_patterns_are_compiled_once():
+    automaton = AhoCorasick(["pain", "pain"])
+    assert automaton.patterns == ["pain"]
+    assert find(automaton, "pain") == [(0, "pain")]
+
+
+@pytest.fixture
+def detector():
+    return EmergencyDetector(
+        ["chest pain", "difficulty breathing"], ["help me", "can't breathe", "pain"],
+        alert_phrases=["can't breathe", "heart attack"],
+    )
+
+
+def test_a_phrase_in_several_lists_has_every_kind(detector):
+    assert detector.has_keyword("I CAN'T BREATHE") and detector.has_alert_phrase("I CAN'T BREATHE")
+    assert detector.has_keyword("please help me") and not detector.has_alert_phrase("please help me")
+    assert detector.scan("help me, heart attack", EmergencyDetector.ALERT) == [(9, "heart attack")]
+
+
+def test_overlapping_phrases_of_different_kinds(detector):
+    # "chest pain" is a symptom and ends in the keyword "pain".
+    assert detector.scan("chest pain") == [(0, "chest pain"), (6, "pain")]
+    assert detector.has_keyword("chest pain")
+    assert detector.scan("chest pain", EmergencyDetector.SYMPTOM) == [(0, "chest pain")]
+    assert not detector.has_alert_phrase("chest pain")
+
+
+def test_emergency_symptoms(detector):
+    assert detector.is_emergency_symptom("severe chest pain")
+    assert detector.is_emergency_symptom("breathing")
+    assert detector.is_emergency_symptom("chest pian")
+    assert not detector.is_emergency_symptom("headache")
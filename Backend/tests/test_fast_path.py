@@ -0,0 +1,134 @@
+import asyncio
+
+from addons.fast_path import EmergencyFastPath
+from addons.screening import emergency_detector
+
+ALERT = {"text": "Call emergency services now.", "utter_action": "utter_emergency_alert"}
+
+
+class Collector:
+    def __init__(self):
+        self.messages = []
+
+    def name(self):
+        return "rest"
+
+    async def send_response(self, recipient_id, message):
+        self.messages.append(message)
+
+
+class Streamed(Collector):
+    pass
+
+
+class Message:
+    def __init__(self, text, output_channel, sender_id="student"):
+        self.text = text
+        self.output_channel = output_channel
+        self.sender_id = sender_id
+
+
+class FastPath(EmergencyFastPath):
+    def __init__(self):
+        super().__init__()
+        self.recorded = []
+
+    def is_emergency(self, text):
+        return emergency_detector().has_alert_phrase(text)
+
+    async def alert(self, sender_id):
+        return dict(ALERT)
+
+    async def record_alert(self, sender_id, alert):
+        self.recorded.append(sender_id)
+
+    def relay(self, message, output_channel):
+        return Message(message.text, output_channel, message.sender_id)
+
+    def is_streaming(self, message):
+        return isinstance(message.output_channel, Streamed)
+
+
+def pipeline(release, replies=("utter_emergency_alert", "utter_ask_symptoms")):
+    async def on_new_message(message):
+        await release.wait()
+        for reply in replies:
+            text = ALERT["text"] if reply == "utter_emergency_alert" else reply
+            await message.output_channel.send_response(message.sender_id, {"text": text})
+    return on_new_message
+
+
+def test_alert_phrases():
+    detector = emergency_detector()
+    for text in ["I can't breathe", "im having a heart attack", "i think im having a stroke", "i feel suicidal"]:
+        assert detector.has_alert_phrase(text), text
+    for text in ["help me my arm is broken", "i have a headache", "this is an emergency"]:
+        assert not detector.has_alert_phrase(text), text
+
+
+def test_plain_request_is_answered_before_the_pipeline_finishes():
+    async def run():
+        fast_path, release = FastPath(), asyncio.Event()
+        handle = fast_path.fast_path(pipeline(release))
+        channel = Collector()
+        await asyncio.wait_for(handle(Message("I can't breathe", channel)), 1)
+        assert channel.messages == [ALERT]
+        assert fast_path.in_background == 1 and not fast_path.recorded
+
+        release.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert fast_path.in_background == 0
+        assert fast_path.recorded == ["student"]
+        # The pipeline's own copy of the alert is left out.
+        assert fast_path.pending == {"student": [{"text": "utter_ask_symptoms"}]}
+
+        later = Collector()
+        await handle(Message("what now", later))
+        assert later.messages[0] == {"text": "utter_ask_symptoms"}
+        assert fast_path.take_pending("student") == []
+
+    asyncio.run(run())
+
+
+def test_next_message_waits_for_the_background_pipeline():
+    async def run():
+        fast_path, release = FastPath(), asyncio.Event()
+        handle = fast_path.fast_path(pipeline(release))
+        await handle(Message("I can't breathe", Collector()))
+
+        later = Collector()
+        following = asyncio.ensure_future(handle(Message("hello", later)))
+        await asyncio.sleep(0)
+        assert not following.done()
+        release.set()
+        await following
+        # The emergency message's replies come first, then the new message's.
+        assert later.messages[0] == {"text": "utter_ask_symptoms"}
+        assert len(later.messages) == 1 + 2
+
+    asyncio.run(run())
+
+
+def test_streamed_request_runs_the_pipeline_inline():
+    async def run():
+        fast_path, release = FastPath(), asyncio.Event()
+        release.set()
+        channel = Streamed()
+        await fast_path.fast_path(pipeline(release))(Message("heart attack", channel))
+        assert channel.messages == [ALERT, {"text": "utter_ask_symptoms"}]
+        assert fast_path.recorded == ["student"] and fast_path.in_background == 0
+
+    asyncio.run(run())
+
+
+def test_other_messages_pass_through():
+    async def run():
+        fast_path, release = FastPath(), asyncio.Event()
+        release.set()
+        channel = Collector()
+        await fast_path.fast_path(pipeline(release, ["utter_greet"]))(Message("help me my arm is broken", channel))
+        assert channel.messages == [{"text": "utter_greet"}]
+        assert fast_path.alerts == 0 and not fast_path.recorded
+
+    asyncio.run(run())
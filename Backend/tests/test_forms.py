@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions.actions import ValidateSymptomForm
+
+
+def validate_duration(value):
+    tracker = Tracker("test", {}, {"text": value}, [], False, None, {}, None)
+    dispatcher = CollectingDispatcher()
+    slots = asyncio.run(ValidateSymptomForm().validate_duration(value, dispatcher, tracker, {}))
+    return slots, dispatcher.messages
+
+
+@pytest.mark.parametrize("value", [
+    # Accepted by the keyword check the parser replaced
+    "for days", "weeks", "a while ago", "hours", "a few hours ago",
+    # Lengths and points in time
+    "2 days", "3 hours ago", "36h", "a couple of weeks", "since yesterday",
+])
+def test_duration_is_accepted(value):
+    slots, messages = validate_duration(value)
+    assert slots["duration"] == value
+    assert slots["duration_hours"] > 0
+    assert not messages
+
+
+@pytest.mark.parametrize("value", ["banana", "not sure", ""])
+def test_duration_is_asked_again(value):
+    slots, messages = validate_duration(value)
+    assert slots == {"duration": None, "duration_hours": None}
+    assert len(messages) == 1
+
+
+def test_vague_duration_uses_unit_span():
+    assert validate_duration("for days")[0]["duration_hours"] == (24.0 + 168.0) / 2
+    assert validate_duration("2 days")[0]["duration_hours"] == 48.0
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from actions.fuzzy import FuzzyVocabulary, char_wb_grams, edit_distance
+
+
+def osa(a, b):
+    """Unbounded optimal string alignment distance, the textbook way"""
+    d = [[i + j if not i or not j else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("headache", "headache", 0),
+    ("headake", "headache", 2),
+    ("haedache", "headache", 1),   # one transposition
+    ("ca", "abc", 3),              # OSA does not edit a transposed pair again
+    ("fevr", "fever", 1),
+    ("", "abc", 3),
+])
+def test_edit_distance(a, b, distance):
+    assert osa(a, b) == distance
+    assert edit_distance(a, b, 3) == distance
+
+
+def test_edit_distance_stops_past_the_limit():
+    rng = random.Random(7)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        limit, distance = rng.randint(0, 3), osa(a, b)
+        if distance <= limit:
+            assert edit_distance(a, b, limit) == distance, (a, b, limit)
+        else:
+            assert edit_distance(a, b, limit) > limit, (a, b, limit)
+
+
+def test_char_wb_grams():
+    assert char_wb_grams("ache") == {" a", "ac", "ch", "he", "e "}
+    assert char_wb_grams("") == {"  "}
+
+
+@pytest.fixture
+def vocabulary():
+    return FuzzyVocabulary(["headache", "stomach ache", "sore throat", "fever", "chills", "nausea"])
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("headache", "headache"),
+    ("headake", "headache"),
+    ("haedache", "headache"),
+    ("stomache", "stomach"),
+    ("fevr", "fever"),
+    ("nausia", "nausea"),
+    ("throt", "throat"),
+    ("banana", None),
+    ("fvr", None),        # shorter than min_length
+    ("chill", "chills"),
+])
+def test_correct(vocabulary, word, expected):
+    assert vocabulary.correct(word) == expected
+
+
+def test_short_words_allow_one_edit_only(vocabulary):
+    assert vocabulary.correct("fevr") == "fever"
+    assert vocabulary.correct("fvre") is None
+
+
+def test_correct_text(vocabulary):
+    assert vocabulary.correct_text("Bad HEADAKE and a sor throt") == "bad headache and a sor throat"
+    assert vocabulary.correct_text("  stomache   ache ") == "stomach ache"
+    assert vocabulary.correct_text("") == ""
+
+
+def test_corrections_are_memoized_and_bounded():
+    vocabulary = FuzzyVocabulary(["headache"], maxsize=2)
+    vocabulary.correct("headake")
+    assert vocabulary._corrections == {"headake": "headache"}
+    vocabulary.correct("headach")
+    vocabulary.correct("hedache")
+    assert vocabulary._corrections == {"hedache": "headache"}
+    # Known words are not memoized.
+    vocabulary.correct("headache")
+    assert "headache" not in vocabulary._corrections
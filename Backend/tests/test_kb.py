@@ -0,0 +1,66 @@
+import hashlib
+
+import pytest
+
+from actions.kb import FORMAT_VERSION, KnowledgeBase, build_artifact, compile_kb, read_source
+from actions.symptom_index import SymptomIndex
+
+SOURCE = read_source()
+
+
+@pytest.fixture(scope="module")
+def kb():
+    return KnowledgeBase(compile_kb(SOURCE, hashlib.sha256(b"source").digest()))
+
+
+def test_ailments_round_trip(kb):
+    assert list(kb.ailments) == list(SOURCE["ailments"])
+    for name, record in SOURCE["ailments"].items():
+        assert kb.ailments[name] == dict(record, severity=record.get("severity", ""))
+        ailment = kb.ailment(name)
+        assert kb.records[ailment.id] == ailment and ailment.name == name
+    assert kb.records[-1] == kb.records[len(kb.records) - 1]
+    assert kb.records[:2] == [kb.records[0], kb.records[1]]
+    with pytest.raises(IndexError):
+        kb.records[len(kb.records)]
+
+
+def test_lists_and_medications_round_trip(kb):
+    assert kb.emergency_symptoms == SOURCE["emergency_symptoms"]
+    assert kb.emergency_keywords == SOURCE["emergency_keywords"]
+    assert kb.emergency_alert_phrases == SOURCE["emergency_alert_phrases"]
+    assert kb.medication_info == {
+        key: {"dosage": info["dosage"], "notes": info["notes"], "aliases": list(info.get("aliases", ()))}
+        for key, info in SOURCE["medication_info"].items()
+    }
+
+
+def test_symptom_index_matches_one_built_from_the_source(kb):
+    expected = SymptomIndex.from_ailments(SOURCE["ailments"], SOURCE["symptom_synonyms"])
+    index = kb.symptom_index()
+    assert list(index.symptoms) == list(expected.symptoms)
+    assert [tuple(ids) for ids in index.symptom_ailments] == expected.symptom_ailments
+    assert list(index.symptom_counts) == expected.symptom_counts
+    assert index.rank(["fever", "cough"]) == expected.rank(["fever", "cough"])
+
+
+def test_strings_are_shared(kb):
+    first, second = kb.records[0], kb.records[0]
+    assert first.duration is second.duration
+    assert kb.version == hashlib.sha256(b"source").hexdigest()[:12]
+
+
+def test_artifact_on_disk(tmp_path):
+    artifact = str(tmp_path / "student_health.kb")
+    build_artifact(artifact=artifact)
+    kb = KnowledgeBase.open(artifact)
+    assert list(kb.ailments) == list(SOURCE["ailments"])
+
+
+def test_other_formats_are_rejected():
+    data = bytearray(compile_kb(SOURCE))
+    data[4] = FORMAT_VERSION + 1
+    with pytest.raises(ValueError):
+        KnowledgeBase(bytes(data))
+    with pytest.raises(ValueError):
+        KnowledgeBase(b"JUNK" + bytes(data[4:]))
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+from actions.kb import read_source
+from actions.parsing import (
+    A_WHILE, CHRONIC, Duration, parse_details, parse_duration, parse_severity, parse_severity_range,
+    parse_typical_duration,
+)
+
+WEDNESDAY = datetime(2024, 1, 3)
+
+
+@pytest.mark.parametrize("text, low, high", [
+    ("36h", 36, 36),
+    ("2 days", 48, 48),
+    ("2-3 days", 48, 72),
+    ("3 to 2 days", 48, 72),
+    ("two or three weeks", 336, 504),
+    ("a couple of weeks ago", 336, 336),
+    ("half an hour", 0.5, 0.5),
+    ("for 1.5 hrs", 1.5, 1.5),
+    ("about forty eight hours", 48, 48),
+    ("since yesterday", 24, 24),
+    ("started LAST   NIGHT", 12, 12),
+    ("since monday", 48, 48),
+    ("since wednesday", 168, 168),
+    ("10 mins", 1 / 6, 1 / 6),
+])
+def test_lengths_and_points_in_time(text, low, high):
+    assert parse_details(text, WEDNESDAY).duration == Duration(pytest.approx(low), pytest.approx(high))
+
+
+@pytest.mark.parametrize("text", ["and then", "banana", "a dog", "10/10", "it hurts"])
+def test_no_duration(text):
+    assert parse_details(text, WEDNESDAY).duration is None
+
+
+@pytest.mark.parametrize("text, duration", [
+    ("for days", Duration(24.0, 168.0)),
+    ("weeks", Duration(168.0, 730.0)),
+    ("a few hours ago", Duration(3.0, 3.0)),
+    ("a while ago", Duration(*A_WHILE)),
+    ("not sure", None),
+])
+def test_loose_duration_replies(text, duration):
+    assert parse_duration(text, WEDNESDAY) == duration
+
+
+@pytest.mark.parametrize("text, severity", [
+    ("mild", "mild"),
+    ("it's not too bad", "mild"),
+    ("pretty bad", "moderate"),
+    ("quite   bad", "moderate"),
+    ("it is KILLING ME", "severe"),
+    ("the worst", "severe"),
+    ("3/10", "mild"),
+    ("5 out of 10", "moderate"),
+    ("10/10", "severe"),
+    ("bad", None),
+    ("the pain", None),
+])
+def test_severity(text, severity):
+    assert parse_severity(text) == severity
+
+
+def test_first_duration_and_severity_in_one_pass():
+    details = parse_details("a severe headache for 2 days, mild fever since yesterday", WEDNESDAY)
+    assert details.duration == Duration(48.0, 48.0)
+    assert details.severity == "severe"
+
+
+@pytest.mark.parametrize("text, duration", [
+    ("4-72 hours", Duration(4.0, 72.0)),
+    ("Few days to weeks", Duration(72.0, 730.0)),
+    ("Minutes to hours", Duration(1 / 60, 24.0)),
+    ("Chronic condition", Duration(*CHRONIC)),
+    ("Variable", None),
+    ("Until treated", None),
+])
+def test_typical_duration(text, duration):
+    assert parse_typical_duration(text) == duration
+
+
+def test_severity_range():
+    assert parse_severity_range("mild to moderate") == (0, 1)
+    assert parse_severity_range("Moderate to severe") == (1, 2)
+    assert parse_severity_range("severe") == (2, 2)
+    assert parse_severity_range("varies") is None
+
+
+def test_knowledge_base_courses_and_severities_parse():
+    # Courses with no length at all ("Variable", "Until treated") stay unparsed.
+    for name, record in read_source()["ailments"].items():
+        if any(char.isdigit() for char in record["duration"]) or "chronic" in record["duration"].lower():
+            assert parse_typical_duration(record["duration"]), name
+        if record.get("severity"):
+            assert parse_severity_range(record["severity"]), name
@@ -0,0 +1,75 @@
+import pytest
+
+from actions import scoring
+from actions.kb import read_source
+from actions.scoring import ScoringEngine
+from actions.symptom_index import SymptomIndex
+
+np = pytest.importorskip("numpy")
+
+SOURCE = read_source()
+INDEX = SymptomIndex.from_ailments(SOURCE["ailments"], SOURCE["symptom_synonyms"])
+SYMPTOM_SETS = [
+    ["fever"], ["headache", "fever", "cough"], ["pain"], ["sore throat", "runny nose", "sneezing"],
+    ["nausea", "vomiting", "stomach ache", "diarrhea"], ["tired", "dizzy"], ["rash", "itching"],
+]
+
+
+def fit_for(index):
+    # Distinct values with repeats, so the profile both breaks and keeps ties.
+    return [(i * 7 % 5) / 4 for i in range(len(index.ailments))]
+
+
+@pytest.mark.parametrize("symptoms", SYMPTOM_SETS)
+@pytest.mark.parametrize("k", [1, 3, 10, 1000])
+@pytest.mark.parametrize("profile", [False, True])
+def test_vectorized_top_k_agrees_with_the_dict_path(symptoms, k, profile):
+    fit = fit_for(INDEX) if profile else None
+    matches = [INDEX.matching_symptoms(text) for text in symptoms]
+    expected = INDEX.rank_scores(INDEX.score_matches(matches), fit)[:k]
+    vectorized = ScoringEngine(INDEX, min_candidates=0).top_k(symptoms, k, fit)
+    assert [(name, score) for name, score, _ in vectorized] == [(name, score) for name, score, _ in expected]
+    assert [p for _, _, p in vectorized] == pytest.approx([p for _, _, p in expected])
+
+
+def test_scores_count_a_user_symptom_once_per_ailment():
+    engine = ScoringEngine(INDEX, min_candidates=0)
+    # "head" matches several symptoms of some ailments, which still count once.
+    matches = [INDEX.matching_symptoms("head"), INDEX.matching_symptoms("pain")]
+    scores = engine.scores(matches)
+    assert {a: int(s) for a, s in enumerate(scores) if s} == INDEX.score_matches(matches)
+    assert not engine.scores([set()]).any()
+
+
+def test_ties_at_the_cut_keep_knowledge_base_order():
+    ailments = {f"ailment_{i}": {"symptoms": ["cough", f"symptom {i}"]} for i in range(12)}
+    ailments["ailment_5"]["symptoms"].append("fever")
+    index = SymptomIndex.from_ailments(ailments)
+    engine = ScoringEngine(index, min_candidates=0)
+    # ailment_5 scores 2; the other eleven tie on 1 and argpartition picks among them.
+    assert [name for name, _, _ in engine.top_k(["cough", "fever"], 4)] == [
+        "ailment_5", "ailment_0", "ailment_1", "ailment_2",
+    ]
+    # Equal scores and percentages, ordered by fit, then knowledge base order.
+    fit = [0.0] * 12
+    fit[9] = fit[7] = 1.0
+    assert [name for name, _, _ in engine.top_k(["cough"], 3, fit)] == ["ailment_7", "ailment_9", "ailment_0"]
+    assert engine.top_k(["cough"], 0) == [] and engine.top_k(["zzzz"], 3) == []
+
+
+def test_small_candidate_sets_use_the_dict_path():
+    engine = ScoringEngine(INDEX)
+    few = [INDEX.matching_symptoms("sneezing")]
+    many = [INDEX.matching_symptoms(text) for text in ["pain", "fever", "cough", "headache", "fatigue"]]
+    assert not engine.vectorize(few)
+    assert engine.vectorize(many) == (
+        sum(len(INDEX.symptom_ailments[s]) for ids in many for s in ids) >= scoring.MIN_VECTOR_CANDIDATES
+    )
+
+
+def test_without_numpy(monkeypatch):
+    expected = ScoringEngine(INDEX, min_candidates=0).top_k(["headache", "fever"], 3)
+    monkeypatch.setattr(scoring, "np", None)
+    engine = ScoringEngine(INDEX, min_candidates=0)
+    assert not engine.vectorize([INDEX.matching_symptoms("fever")])
+    assert engine.top_k(["headache", "fever"], 3) == expected
@@ -0,0 +1,69 @@
+from addons.summary import SUMMARY_SLOT, cleared_summary, cut, empty_summary, summarize
+
+
+def user(text, *symptoms):
+    entities = [{"entity": "symptom", "value": symptom} for symptom in symptoms]
+    return {"event": "user", "text": text, "parse_data": {"text": text, "entities": entities}}
+
+
+def slot(name, value):
+    return {"event": "slot", "name": name, "value": value}
+
+
+def turn(text, *symptoms):
+    return [user(text, *symptoms), {"event": "action", "name": "utter_ask_symptoms"},
+            {"event": "bot", "text": "Tell me more."}, {"event": "action", "name": "action_listen"}]
+
+
+def has_keyword(text):
+    return "breathe" in text
+
+
+def test_summarize_folds_symptoms_slots_and_keywords():
+    events = [
+        *turn("I can't breathe", "shortness of breath"),
+        slot("symptoms", ["fever", "shortness of breath"]),
+        slot("emergency_case", True),
+        slot("identified_ailment", "Asthma"),
+        *turn("and a cough", "cough"),
+    ]
+    assert summarize(events, has_keyword) == {
+        "symptoms": ["shortness of breath", "fever", "cough"],
+        "emergency_keyword": True,
+        "emergency_flagged": True,
+        "identified_ailment": "Asthma",
+    }
+
+
+def test_summarize_carries_an_earlier_summary():
+    earlier = {"symptoms": ["rash"], "emergency_keyword": True, "emergency_flagged": False,
+               "identified_ailment": "Eczema"}
+    summary = summarize([slot(SUMMARY_SLOT, earlier), *turn("itchy", "itching")], has_keyword)
+    assert summary == {"symptoms": ["rash", "itching"], "emergency_keyword": True,
+                       "emergency_flagged": False, "identified_ailment": "Eczema"}
+
+
+def test_new_session_starts_a_new_summary():
+    events = [*turn("I can't breathe", "cough"), {"event": "session_started"}, *turn("headache", "headache")]
+    assert summarize(events, has_keyword) == dict(empty_summary(), symptoms=["headache"])
+
+
+def test_cut_starts_the_kept_window_at_a_user_message():
+    events = [{"event": "action", "name": "action_listen"}] + turn("a") + turn("b") + turn("c")
+    assert cut(events, 6) == 9
+    assert events[cut(events, 6)]["text"] == "c"
+    assert cut(events, 8) == 5
+    assert cut(events, len(events)) == 1
+    # Nothing before the first user message in the window
+    assert cut(events[1:], 100) is None
+    assert cut(events[:4], 2) is None
+
+
+def test_cleared_summary():
+    summary = dict(empty_summary(), emergency_keyword=True)
+    events = [slot(SUMMARY_SLOT, summary), *turn("hello"), {"event": "reset_slots"}]
+    assert cleared_summary(reversed(events)) == summary
+    # Cleared on purpose, or before the current session
+    assert cleared_summary(reversed(events + [slot(SUMMARY_SLOT, None)])) is None
+    assert cleared_summary(reversed([slot(SUMMARY_SLOT, summary), {"event": "session_started"}])) is None
+    assert cleared_summary(reversed(turn("hello"))) is None
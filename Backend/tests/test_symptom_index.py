@@ -0,0 +1,66 @@
+import pytest
+
+from actions.kb import read_source
+from actions.symptom_index import SymptomIndex
+
+SOURCE = read_source()
+AILMENTS = SOURCE["ailments"]
+INDEX = SymptomIndex.from_ailments(AILMENTS)
+
+SAMPLE = [
+    "headache", "head", "fever", "cough", "sore", "throat", "ache", "stomach ache", "runny nose",
+    "i have a headache and a runny nose", "high fever and chills", "pain", "rash", "itchy skin",
+    "nausea", "dizzy", "fatigue", "sneezing a lot", "chest", "back pain",
+]
+
+
+def reference_rank(symptoms):
+    """The pairwise scan identify_ailment did before the index, with the
+    index's rule that user text inside a KB symptom starts at a word"""
+    ranked = []
+    for ailment, data in AILMENTS.items():
+        ailment_symptoms = [s.lower() for s in data["symptoms"]]
+        score = sum(
+            any((" " + symptom) in (" " + kb) or kb in symptom for kb in ailment_symptoms)
+            for symptom in (s.lower() for s in symptoms)
+        )
+        if score:
+            ranked.append((ailment, score, score / len(ailment_symptoms) * 100))
+    return sorted(ranked, key=lambda match: (-match[1], -match[2]))
+
+
+@pytest.mark.parametrize("text", SAMPLE)
+def test_single_symptom_ranks_like_the_pairwise_scan(text):
+    expected = reference_rank([text])
+    if expected:
+        assert INDEX.rank([text]) == expected
+
+
+@pytest.mark.parametrize("symptoms", [SAMPLE[i:i + 3] for i in range(0, len(SAMPLE), 3)] + [SAMPLE])
+def test_symptom_sets_rank_like_the_pairwise_scan(symptoms):
+    assert INDEX.rank(symptoms) == reference_rank(symptoms)
+
+
+def test_user_text_inside_a_symptom_starts_at_a_word():
+    names = {INDEX.symptoms[s] for s in INDEX.matching_symptoms("head")}
+    assert "headache" in names
+    assert all((" " + "head") in (" " + name) for name in names)
+    assert not {INDEX.symptoms[s] for s in INDEX.matching_symptoms("ache")} & {"headache"}
+
+
+def test_symptom_inside_user_text():
+    names = {INDEX.symptoms[s] for s in INDEX.matching_symptoms("i have a headache and a runny nose")}
+    assert {"headache", "runny nose"} <= names
+
+
+def test_typos_are_corrected_when_nothing_matches():
+    assert "headache" in {INDEX.symptoms[s] for s in INDEX.matching_symptoms("headake")}
+    assert not INDEX.matching_symptoms("zzzz")
+
+
+def test_synonyms_share_the_ailments_of_their_symptom():
+    index = SymptomIndex.from_ailments(AILMENTS, SOURCE["symptom_synonyms"])
+    by_text = dict(zip(index.symptoms, index.symptom_ailments))
+    assert by_text["tired"] == by_text["fatigue"]
+    ranked = {name for name, _, _ in index.rank(["tired"])}
+    assert ranked >= {index.ailments[a] for a in by_text["fatigue"]}
@@ -0,0 +1,86 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("rasa")
+
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActionExecuted, AllSlotsReset, BotUttered, SlotSet, UserUttered
+from rasa.shared.core.trackers import DialogueStateTracker, EventVerbosity
+from rasa_sdk import Tracker
+
+from actions.actions import screen_conversation
+from addons.tracker_store import SUMMARY_SLOT, CompactingTrackerStore
+
+DOMAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "domain.yml")
+
+
+def turn(text):
+    return [
+        UserUttered(text, intent={"name": "describe_symptoms", "confidence": 1.0}),
+        ActionExecuted("utter_ask_symptoms"),
+        BotUttered("Tell me more."),
+        ActionExecuted("action_listen"),
+    ]
+
+
+def save_and_retrieve(store, tracker):
+    asyncio.run(store.save(tracker))
+    return asyncio.run(store.retrieve(tracker.sender_id))
+
+
+@pytest.fixture
+def store():
+    return CompactingTrackerStore(Domain.load(DOMAIN_PATH), max_events=20, keep_events=8)
+
+
+def test_summary_survives_restart_and_later_compaction(store):
+    events = [ActionExecuted("action_listen"), *turn("I can't breathe")]
+    for _ in range(5):
+        events += turn("still feeling off")
+    tracker = DialogueStateTracker.from_events("restart", events, slots=store.domain.slots)
+
+    tracker = save_and_retrieve(store, tracker)
+    assert tracker.get_slot(SUMMARY_SLOT)["emergency_keyword"]
+    assert not any(isinstance(e, UserUttered) and e.text == "I can't breathe" for e in tracker.events)
+
+    # action_restart and action_check_emergency both reset every slot.
+    tracker.update(ActionExecuted("action_restart"))
+    tracker.update(AllSlotsReset())
+    tracker = save_and_retrieve(store, tracker)
+    assert tracker.get_slot(SUMMARY_SLOT)["emergency_keyword"]
+
+    for _ in range(5):
+        for event in turn("what should I do"):
+            tracker.update(event)
+    tracker = save_and_retrieve(store, tracker)
+    assert len(tracker.events) <= store.max_events
+    assert tracker.get_slot(SUMMARY_SLOT)["emergency_keyword"]
+
+    state = tracker.current_state(EventVerbosity.ALL)
+    assert screen_conversation(Tracker.from_dict(state), [])
+
+
+def test_cleared_summary_stays_cleared(store):
+    tracker = DialogueStateTracker.from_events(
+        "no-summary", [ActionExecuted("action_listen"), *turn("headache"), AllSlotsReset()],
+        slots=store.domain.slots,
+    )
+    tracker = save_and_retrieve(store, tracker)
+    assert tracker.get_slot(SUMMARY_SLOT) is None
+
+
+def test_save_leaves_the_callers_tracker_alone(store):
+    tracker = DialogueStateTracker.from_events(
+        "copy", [ActionExecuted("action_listen"), *turn("I can't breathe"), AllSlotsReset()],
+        slots=store.domain.slots,
+    )
+    tracker.update(SlotSet(SUMMARY_SLOT, {"symptoms": [], "emergency_keyword": True}))
+    tracker.update(AllSlotsReset())
+    events = len(tracker.events)
+
+    stored = save_and_retrieve(store, tracker)
+    assert stored.get_slot(SUMMARY_SLOT)["emergency_keyword"]
+    assert len(tracker.events) == events
+    assert tracker.get_slot(SUMMARY_SLOT) is None